@@ -0,0 +1,285 @@
+"""
+Offline crawler benchmark: serves a synthetic corpus (utils.fixture_server)
+from a local HTTP server and drives the crawler against it, reporting URLs/sec,
+per-URL latency percentiles, CPU time and peak RSS of the crawler's processes.
+
+    python benchmark_crawler.py --bench url2lines --urls 200
+    python benchmark_crawler.py --bench process_claims --urls 1000 --max_processes 8
+    python benchmark_crawler.py --compare data/benchmarks/old.json data/benchmarks/new.json
+
+url2lines crawls the URLs one after the other with a single WebpageProcessor;
+process_claims runs the full crawl (scheduler, worker pool, crawl log, claim
+files) in a scratch directory. Reports are written as JSON under
+data/benchmarks/, tagged with the git revision, so runs of different versions
+of the crawler on the same corpus can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from time import perf_counter
+
+import psutil
+
+from crawl_evidence import cleanup_processor, crawl_urls, make_processor, process_claims
+from utils.crawl_log import CrawlLog
+from utils.crawl_metrics import percentile
+from utils.fixture_server import DEFAULT_MIX, corpus_urls, parse_mix, start_server_process
+from utils.url_utils import normalize_url
+from utils.worker_pool import process_tree
+
+# Report fields compared by --compare, and whether lower is better
+COMPARED = [
+    ("urls_per_sec", False),
+    ("latency.p50", True),
+    ("latency.p95", True),
+    ("latency.p99", True),
+    ("cpu_seconds", True),
+    ("peak_rss_mb", True),
+    ("ok", False),
+]
+
+
+class ResourceMonitor:
+    """
+    Samples CPU time and RSS of this process and all its descendants (pool
+    workers, forkserver, Chrome) every interval seconds, leaving out the pids
+    in exclude. CPU time of a process is counted up to its last sample.
+    """
+    def __init__(self, exclude=(), interval=0.2):
+        self.exclude = set(exclude)
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu = {}
+        self._baseline = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        rss = 0
+        for process in process_tree(os.getpid()):
+            if process.pid in self.exclude:
+                continue
+            try:
+                with process.oneshot():
+                    rss += process.memory_info().rss
+                    times = process.cpu_times()
+                    self.cpu[(process.pid, process.create_time())] = times.user + times.system
+            except psutil.Error:
+                continue
+        self.peak_rss = max(self.peak_rss, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._baseline = dict(self.cpu)
+        self.peak_rss = 0
+        self._thread = threading.Thread(target=self._run, name="resource-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+    def cpu_seconds(self):
+        return sum(self.cpu.values()) - sum(self._baseline.values())
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_url2lines(urls, timeout, processor_options):
+    """Crawls (kind, url) pairs serially. Returns [(kind, seconds, lines, failure)]."""
+    processor = make_processor(**processor_options)
+    results = []
+    try:
+        for kind, url in urls:
+            start = perf_counter()
+            [(_, lines, trace)] = crawl_urls(processor, [(normalize_url(url), url)], timeout, "sync", 1, 1)
+            results.append((kind, perf_counter() - start, len(lines), trace["failure"]))
+    finally:
+        cleanup_processor(processor)
+    return results
+
+
+def bench_process_claims(urls, max_processes, urls_per_claim, workdir, **process_kwargs):
+    """
+    Crawls (kind, url) pairs as the evidence of synthetic claims, urls_per_claim
+    each, with process_claims run in workdir. Returns
+    ([(kind, None, lines, failure)], per-URL latency percentiles from the crawl metrics).
+    """
+    search_results = {}
+    dataset = []
+    for start in range(0, len(urls), urls_per_claim):
+        claim = f"Synthetic claim {start // urls_per_claim}"
+        dataset.append({"claim_id": start // urls_per_claim, "claim": claim})
+        search_results[claim] = {claim: {"1": [{"link": url, "position": rank + 1}
+                                               for rank, (_, url) in enumerate(urls[start:start + urls_per_claim])]}}
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        process_claims(dataset, search_results, max_processes, **process_kwargs)
+        with open("data/crawl_metrics.json") as f:
+            total = json.load(f)["run"]["stages"].get("total", {})
+        crawl_log = CrawlLog("data/crawl_log")
+        results = []
+        for kind, url in urls:
+            status = crawl_log.status(normalize_url(url))
+            if status is None:
+                results.append((kind, None, 0, "not_crawled"))
+            else:
+                _, page_hash, failure, _ = status
+                results.append((kind, None, 1 if page_hash else 0, failure))
+        crawl_log.close()
+    finally:
+        os.chdir(cwd)
+    return results, {q: total.get(q, 0.0) for q in ("p50", "p95", "p99")}
+
+
+def summarize(results, seconds, monitor, latency=None):
+    latencies = [latency for _, latency, _, _ in results if latency is not None]
+    if latency is None:
+        latency = {
+            "p50": round(percentile(latencies, 0.5), 4),
+            "p95": round(percentile(latencies, 0.95), 4),
+            "p99": round(percentile(latencies, 0.99), 4),
+        }
+    kinds = defaultdict(Counter)
+    failures = Counter()
+    for kind, _, lines, failure in results:
+        kinds[kind]["ok" if lines else "failed"] += 1
+        if failure:
+            failures[failure] += 1
+    return {
+        "urls": len(results),
+        "ok": sum(1 for _, _, lines, _ in results if lines),
+        "seconds": round(seconds, 3),
+        "urls_per_sec": round(len(results) / seconds, 3) if seconds else 0.0,
+        "latency": latency,
+        "cpu_seconds": round(monitor.cpu_seconds(), 2),
+        "peak_rss_mb": round(monitor.peak_rss / 1024**2, 1),
+        "kinds": {kind: dict(counts) for kind, counts in sorted(kinds.items())},
+        "failures": dict(failures),
+    }
+
+
+def _field(report, path):
+    value = report
+    for key in path.split("."):
+        value = (value or {}).get(key)
+    return value
+
+
+def compare(paths):
+    """Prints the COMPARED fields of benchmark reports side by side, with the change from the first."""
+    reports = []
+    for path in paths:
+        with open(path) as f:
+            reports.append(json.load(f))
+    print("field".ljust(14) + "".join(f"{report.get('revision') or os.path.basename(path):>22}"
+                                      for report, path in zip(reports, paths)))
+    for field, lower_is_better in COMPARED:
+        base = _field(reports[0], field)
+        row = field.ljust(14)
+        for report in reports:
+            value = _field(report, field)
+            cell = "-" if value is None else f"{value:g}"
+            if report is not reports[0] and value is not None and base:
+                change = (value - base) / base * 100
+                better = change < 0 if lower_is_better else change > 0
+                cell += f" ({change:+.0f}%{'' if round(change) == 0 else ' better' if better else ' worse'})"
+            row += f"{cell:>22}"
+        print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--bench', choices=['url2lines', 'process_claims'], default='url2lines')
+    parser.add_argument('--urls', type=int, default=200, help='Number of corpus URLs to crawl')
+    parser.add_argument('--mix', type=str, default=None,
+                       help=f'Corpus mix as kind=weight,... (default {",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items())})')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the corpus URL draw')
+    parser.add_argument('--timeout', type=float, default=10, help='Per-URL crawl budget in seconds')
+    parser.add_argument('--slow_seconds', type=float, default=2.0, help='Delay of slow pages')
+    parser.add_argument('--huge_mb', type=float, default=12, help='Size of huge pages')
+    parser.add_argument('--max_processes', type=int, default=4, help='process_claims pool workers')
+    parser.add_argument('--urls_per_claim', type=int, default=20, help='Evidence URLs per synthetic claim')
+    parser.add_argument('--engine', choices=['pool', 'pipeline'], default='pool')
+    parser.add_argument('--fetch_mode', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--max_concurrency', type=int, default=32)
+    parser.add_argument('--browser_pool_size', type=int, default=0,
+                       help='Warm Chrome drivers per worker for JS-only pages (0: one driver started on demand)')
+    parser.add_argument('--output', type=str, default=None,
+                       help='Report path (default data/benchmarks/{bench}-{revision}-{time}.json)')
+    parser.add_argument('--keep_workdir', action='store_true', help='Keep the process_claims scratch directory')
+    parser.add_argument('--compare', nargs='+', default=None, help='Compare benchmark reports instead of running one')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    mix = parse_mix(args.mix) if args.mix else DEFAULT_MIX
+    # Timeout pages hang well past the crawl budget
+    server, base_url, stop_server = start_server_process(
+        slow_seconds=args.slow_seconds, hang_seconds=args.timeout * 3, huge_mb=args.huge_mb)
+    urls = corpus_urls(base_url, args.urls, mix, args.seed)
+    processor_options = {"browser_pool_size": args.browser_pool_size}
+    workdir = tempfile.mkdtemp(prefix="crawl_bench_")
+    print(f"Benchmarking {args.bench} on {len(urls)} URLs from {base_url}", file=sys.stderr)
+    try:
+        with ResourceMonitor(exclude={process.pid for process in process_tree(server.pid)}) as monitor:
+            start = perf_counter()
+            if args.bench == "url2lines":
+                results = bench_url2lines(urls, args.timeout, processor_options)
+                latency = None
+            else:
+                # One host serves the whole corpus: no politeness delay or per-domain cap
+                results, latency = bench_process_claims(
+                    urls, args.max_processes, args.urls_per_claim, workdir, timeout=args.timeout,
+                    fetch_mode=args.fetch_mode, max_concurrency=args.max_concurrency, engine=args.engine,
+                    processor_options=processor_options, domain_delay=0, max_per_domain=10**6,
+                    strategy_path="", dedup="off")
+            seconds = perf_counter() - start
+    finally:
+        stop_server()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "bench": args.bench,
+        "revision": git_revision(),
+        "created": time.time(),
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "platform": platform.platform()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        **summarize(results, seconds, monitor, latency),
+    }
+    output = args.output or os.path.join(
+        "data/benchmarks", f"{args.bench}-{report['revision'] or 'unknown'}-{int(report['created'])}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps({key: report[key] for key in ("urls", "ok", "urls_per_sec", "latency", "cpu_seconds",
+                                                   "peak_rss_mb", "kinds")}, indent=2))
+    print(f"Report written to {output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Offline checks of the crawler's building blocks, each a plain function that
+raises AssertionError when the behavior it pins down regresses.
+
+    python check_crawler.py                    # run every check
+    python check_crawler.py scheduler_backoff  # run the named checks
+
+Checks that crawl serve their pages from utils.fixture_server and run
+process_claims in a scratch directory, so they need no network access and
+leave the data directory alone.
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+
+from crawl_evidence import process_claims
+from utils.crawl_log import CrawlLog
+from utils.crawl_scheduler import CrawlScheduler
+from utils.fixture_server import start_server_process
+from utils.url_utils import get_domain_name, normalize_url
+from utils.worker_pool import WorkerPool
+
+
+def check_scheduler_backoff():
+    """A failure reported while its domain is already scheduled still delays the domain's next URL."""
+    scheduler = CrawlScheduler(min_delay=0.2, max_per_domain=2, backoff_factor=10)
+    for i in range(3):
+        scheduler.add(f"http://example.com/{i}")
+    start = time.monotonic()
+    first = scheduler.next_ready(start)
+    assert first is not None
+    # With one URL in flight the domain is back in the heap, due min_delay after the first URL
+    scheduler.done(first[0], ok=False)
+    assert scheduler.next_ready(start + 0.3) is None, "next URL handed out before the failure's backoff"
+    assert scheduler.next_ready(time.monotonic() + 2.1) is not None
+    # A success resets the delay
+    scheduler = CrawlScheduler(min_delay=0.2, max_per_domain=2)
+    for i in range(2):
+        scheduler.add(f"http://example.com/{i}")
+    first = scheduler.next_ready(start)
+    scheduler.done(first[0], ok=True)
+    assert scheduler.next_ready(start + 0.2) is not None
+
+
+def check_normalize_url():
+    """Spelling variants of a URL share one key; scheme-less URLs keep their host."""
+    assert normalize_url("HTTP://www.Example.com:80/path/?utm_source=x&a=1#top") == "http://example.com/path?a=1"
+    assert normalize_url("https://example.com") == "https://example.com/"
+    assert normalize_url("example.com/path") == "http://example.com/path"
+    assert normalize_url("www.example.com/path/") == "http://example.com/path"
+    assert normalize_url("//cdn.example.com/a.js") == "http://cdn.example.com/a.js"
+    assert get_domain_name(normalize_url("news.example.co.uk/story")) == "example.co.uk"
+    # Nothing to take a host from: left alone rather than merged under an empty host
+    assert normalize_url("/relative/path") == "/relative/path"
+    assert normalize_url("example.com/a") != normalize_url("example.org/a")
+
+
+def _pool_task(i):
+    time.sleep(0.001 * (i % 7))
+    return i
+
+
+def check_worker_recycling(tasks=400, processes=4, timeout=60):
+    """
+    A WorkerPool whose workers retire after every task, driven like process_claims
+    (a bounded number of tasks in flight, new ones submitted as results come in),
+    returns every result: no task is lost when its worker is recycled.
+    """
+    results = queue.Queue()
+    pool = WorkerPool(processes, max_tasks=1)
+    submitted = completed = 0
+    returned = set()
+    try:
+        while completed < tasks:
+            while submitted < tasks and submitted - completed < processes * 2:
+                pool.apply_async(_pool_task, (submitted,), callback=results.put, error_callback=results.put)
+                submitted += 1
+            try:
+                result = results.get(timeout=timeout)
+            except queue.Empty:
+                raise AssertionError(f"no result for {timeout}s, {tasks - completed} tasks never completed")
+            assert not isinstance(result, Exception), repr(result)
+            returned.add(result)
+            completed += 1
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    assert returned == set(range(tasks))
+    assert pool.stats()["recycled"].get("max_tasks", 0) >= tasks - processes, pool.stats()
+
+
+def _crawl_claim(urls, workdir, **process_kwargs):
+    """Crawls urls as the evidence of one claim with process_claims in workdir. Returns the claim file's entries."""
+    dataset = [{"claim_id": 0, "claim": "Synthetic claim"}]
+    search_results = {"Synthetic claim": {"query": {"1": [{"link": url} for url in urls]}}}
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        process_claims(dataset, search_results, 2, domain_delay=0, max_per_domain=10, strategy_path="",
+                       processor_options={"browser_pool_size": 0}, **process_kwargs)
+        if not os.path.exists("data/knowledge_store/0.json"):
+            return None
+        with open("data/knowledge_store/0.json") as f:
+            return json.load(f)
+    finally:
+        os.chdir(cwd)
+
+
+def _failures(urls, workdir):
+    crawl_log = CrawlLog(os.path.join(workdir, "data/crawl_log"))
+    try:
+        return [(crawl_log.status(normalize_url(url)) or (None, None, "not_logged"))[2] for url in urls]
+    finally:
+        crawl_log.close()
+
+
+def check_worker_lost_resume():
+    """URLs of a killed crawl worker are logged as worker_lost, not restored on resume, and retried on refresh."""
+    # Slow pages outlast the pool's first memory check, which kills every worker over 1 MB
+    server, base_url, stop_server = start_server_process(slow_seconds=8, hang_seconds=30)
+    workdir = tempfile.mkdtemp(prefix="crawl_check_")
+    urls = [f"{base_url}/slow/{i}" for i in range(2)] + [f"{base_url}/article/{i}" for i in range(2)]
+    try:
+        entries = _crawl_claim(urls, workdir, worker_kill_rss_mb=1)
+        assert _failures(urls, workdir) == ["worker_lost", "worker_lost", None, None], _failures(urls, workdir)
+        assert [bool(entry["text"]) for entry in entries] == [False, False, True, True]
+
+        # A resume that only restores from the crawl log (as after a crash before the claim was
+        # written) must not restore the lost URLs as empty evidence
+        os.remove(os.path.join(workdir, "data/knowledge_store/0.json"))
+        assert _crawl_claim(urls, workdir, crawl=False) is None, "lost URLs restored as empty evidence"
+
+        entries = _crawl_claim(urls, workdir, refresh=True)
+        assert _failures(urls, workdir) == [None] * 4, _failures(urls, workdir)
+        assert all(entry["text"] for entry in entries)
+    finally:
+        stop_server()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+CHECKS = {name[len("check_"):]: func for name, func in globals().items()
+          if name.startswith("check_") and callable(func)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('checks', nargs='*', help=f'Checks to run (default: all of {", ".join(CHECKS)})')
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(unknown)}")
+    failed = []
+    for name in args.checks or CHECKS:
+        start = time.monotonic()
+        try:
+            CHECKS[name]()
+        except Exception:
+            failed.append(name)
+            traceback.print_exc()
+            print(f"FAIL {name}", file=sys.stderr)
+        else:
+            print(f"ok   {name} ({time.monotonic() - start:.1f}s)", file=sys.stderr)
+    if failed:
+        sys.exit(f"{len(failed)} of {len(args.checks or CHECKS)} checks failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,148 +1,737 @@
-import pandas as pd
 import json
 import os
 import multiprocessing
-import tldextract
-import signal
+import multiprocessing.util
+import queue
+import socket
+import time
+from collections import Counter, defaultdict
 from utils.webpage_crawler import WebpageProcessor
+from utils.page_cache import PageCache
+from utils.browser_pool import BrowserPool
+from utils.deadline import deadline, DeadlineExceeded
+from utils.crawl_scheduler import CrawlScheduler
+from utils.crawl_pipeline import CrawlPipeline
+from utils.crawl_log import CrawlLog, content_hash
+from utils.url_utils import get_domain_name, normalize_url, filter_search_results
+from utils.search_store import load_search_results
+from utils.near_dup import NearDuplicateIndex
+from utils.knowledge_store import KnowledgeStore
+from utils.fetch_strategy import FetchStrategy
+from utils.crawl_planner import CrawlPlanner
+from utils.work_queue import WorkQueue
+from utils.worker_pool import WorkerPool, WorkerLost
+from utils.crawl_metrics import CrawlMetrics, collect_traces, trace_url, fail, finish_trace
 import argparse
 
-# Blacklists
-BLACKLIST_DOMAINS = {
-    "jstor.org",
-    "facebook.com",
-    "twitter.com",
-    "x.com",
-    "reddit.com",
-    "linkedin.com",
-    "threads.net",
-    "quora.com",
-    "tiktok.com",
-    "instagram.com",
-    "discord.com",
-    "youtube.com",
-    "spotify.com",
-    "huggingface.co",
-    "politifact.com",
-    "snopes.com",
-    "factcheck.org",
-    "shutterstock.com",
-    "naturepl.com",
-    "example.com",
-    "pinterest.com",
-    "flickr.com",
-    "twitch.tv",
-    "verifythis.com",
-    "telegram.org",
-    "factcheck.africa",
-    "washingtonpost.com",
-    "reuters.com",
-    "nytimes.com"
-}
-
-BLACKLIST_FILES = [
-    "/glove.",
-    "ftp://ftp.cs.princeton.edu/pub/cs226/autocomplete/words-333333.txt",
-    "https://web.mit.edu/adamrose/Public/googlelist",
-]
-
-def get_domain_name(url):
-    if '://' not in url:
-        url = 'http://' + url
-    extracted = tldextract.extract(url)
-    return f"{extracted.domain}.{extracted.suffix}"
-
-def should_filter_link(link):
-    domain = get_domain_name(link)
-    if domain in BLACKLIST_DOMAINS:
-        return True
-    if any(b_file in link for b_file in BLACKLIST_FILES):
-        print("Blacklisted file: ", link)
-        return True
-    if link.endswith((".txt")):
-        print("Blacklisted file type: ", link)
-        return True
-    return False
-
-def crawl_claim_evidences(claim_id, claim_search_results, timeout=45):
-    save_dir = "data/knowledge_store/"
-    processor = WebpageProcessor()
+# Modules imported once in the forkserver parent that crawl workers are forked from
+WORKER_PRELOAD = ["__main__", "utils.worker_preload"]
+
+def crawl_with_timeout(processor, url, timeout, method="auto"):
+    with trace_url(url):
+        try:
+            # Cooperative per-URL budget shared by fetch, Selenium render and extraction
+            with deadline(timeout):
+                crawled_text = processor.url2lines(url, method=method)
+        except Exception as e:
+            fail("deadline" if isinstance(e, DeadlineExceeded) else type(e).__name__)
+            print(e)
+            crawled_text = []
+    return crawled_text
+
+def save_claim_evidences(claim_id, entries, texts, save_dir="data/knowledge_store/",
+                         duplicate_of=None, collapse=False, store=None):
+    """
+    Writes {claim_id}.json from (query, page_num, url) entries and a {normalized_url: lines} map,
+    or adds the claim to store (a utils.knowledge_store.KnowledgeStore) if one is given.
+    duplicate_of maps normalized URLs to the URL of the page they near-duplicate, which is
+    recorded as "duplicate_of"; with collapse, the text of a duplicate whose original is
+    evidence of the same claim is dropped.
+    """
+    duplicate_of = duplicate_of or {}
+    claim_urls = {normalize_url(url) for _, _, url in entries}
     crawled_info = []
-    print("Processing claim", claim_id)
-    
-    class TimeoutException(Exception):
-        pass
-    
-    def timeout_handler(signum, frame):
-        print("Timeout!")
-        raise TimeoutException("Function timed out")
-    
-    for query, page_results in claim_search_results.items():
-        for page_num, results in page_results.items():
-            for result in results:
-                if should_filter_link(result["link"]):
-                    continue
-                try:
-                    print(claim_id, "=>", result["link"])
-                    # Set the timeout
-                    signal.signal(signal.SIGALRM, timeout_handler)
-                    signal.alarm(timeout)
-                    
-                    crawled_text = processor.url2lines(result["link"], method="auto")
-
-                    # Cancel the alarm if the function completes
-                    signal.alarm(0)
-                except Exception as e:
-                    print(e)
-                    crawled_text = []
-
-                crawled_info.append({
-                    "claim_id": claim_id,
-                    "query": query,
-                    "page_num": page_num,
-                    "url": result["link"],
-                    "text": crawled_text
-                })
+    for query, page_num, url in entries:
+        norm_url = normalize_url(url)
+        info = {
+            "claim_id": claim_id,
+            "query": query,
+            "page_num": page_num,
+            "url": url,
+            "text": texts.get(norm_url, [])
+        }
+        original = duplicate_of.get(norm_url)
+        if original is not None:
+            info["duplicate_of"] = original
+            if collapse and normalize_url(original) in claim_urls:
+                info["text"] = []
+        crawled_info.append(info)
 
+    if store is not None:
+        store.write_claim(claim_id, crawled_info)
+        return
     with open(os.path.join(save_dir, f"{claim_id}.json"), "w") as f:
         json.dump(crawled_info, f, indent=2)
+
+def crawl_urls(processor, url_items, timeout, fetch_mode, max_concurrency, max_per_host, methods=None):
+    """
+    Crawls (normalized_url, url) pairs and returns a list of
+    (normalized_url, lines, trace) where trace holds the URL's stage timings and outcome.
+    methods optionally maps a url to its fetch method (default 'auto').
+    """
+    methods = methods or {}
+    batch_failure = "empty_extraction"
+    with collect_traces() as traces:
+        if fetch_mode == "async":
+            try:
+                texts = processor.urls2lines(
+                    [url for _, url in url_items], method="auto", url_budget=timeout, methods=methods,
+                    max_concurrency=max_concurrency, max_per_host=max_per_host)
+            except Exception as e:
+                print(e)
+                texts = {}
+                batch_failure = "batch_failed"
+        else:
+            texts = {}
+            for _, url in url_items:
+                print("=>", url)
+                texts[url] = crawl_with_timeout(processor, url, timeout, methods.get(url, "auto"))
+
+    crawled = []
+    for norm_url, url in url_items:
+        lines = texts.get(url, [])
+        crawled.append((norm_url, lines, finish_trace(traces.get(url), url, lines, batch_failure)))
+    return crawled
+
+def make_processor(page_cache_dir=None, page_cache_gb=20, cache_mode="revalidate",
+                   browser_pool_size=0, browser_max_pages=200, browser_max_rss_mb=1500, warm_browsers=False,
+                   render_mode="fast"):
+    page_cache = None
+    if page_cache_dir:
+        page_cache = PageCache(page_cache_dir, max_bytes=int(page_cache_gb * 1024**3))
+    browser_pool = None
+    if browser_pool_size > 0:
+        browser_pool = BrowserPool(size=browser_pool_size, max_pages=browser_max_pages,
+                                   max_rss_mb=browser_max_rss_mb, render_mode=render_mode)
+        if warm_browsers:
+            browser_pool.warm()
+    # One process per crawl worker: documents are extracted serially, not with a nested pool
+    return WebpageProcessor(page_cache=page_cache, cache_mode=cache_mode, browser_pool=browser_pool,
+                            render_mode=render_mode, doc_workers=1)
+
+def cleanup_processor(processor):
     processor.cleanup()
+    if processor.browser_pool is not None:
+        print("Browser pool launched", processor.browser_pool.launches, "drivers")
+        processor.browser_pool.close()
+
+# Each pool worker keeps one WebpageProcessor for its lifetime
+_worker_processor = None
+
+def init_crawl_worker(processor_options):
+    global _worker_processor
+    _worker_processor = make_processor(**processor_options)
+    multiprocessing.util.Finalize(None, cleanup_processor, args=(_worker_processor,), exitpriority=10)
+
+def crawl_url_batch(url_items, timeout, fetch_mode, max_concurrency, max_per_host, methods=None):
+    return crawl_urls(_worker_processor, url_items, timeout, fetch_mode,
+                      max_concurrency, max_per_host, methods)
+
+def skipped_trace(url):
+    """Trace of a URL that was not crawled because its domain keeps failing."""
+    with trace_url(url) as trace:
+        fail("domain_skipped")
+    return finish_trace(trace, url, [])
+
+def lost_batch(url_items, error):
+    """Results of a pool task that raised error instead of returning its crawled URLs."""
+    failure = "worker_lost" if isinstance(error, WorkerLost) else "batch_failed"
+    print(f"Crawl task of {len(url_items)} URLs failed: {error!r}")
+    return [(norm_url, [], finish_trace(None, url, [], failure)) for norm_url, url in url_items]
 
-def process_claims(dataset, search_results, max_processes):
+def process_claims(dataset, search_results, max_processes, fetch_mode="sync",
+                   max_concurrency=32, max_per_host=4, timeout=45, processor_options=None,
+                   domain_delay=1.0, max_per_domain=2, domain_report="data/crawl_domains.json",
+                   engine="pool", render_workers=2, log_dir="data/crawl_log", crawl=True,
+                   metrics_path="data/crawl_metrics.json", strategy_path="data/fetch_strategy.json",
+                   probe_rate=0.1, dedup="mark", dedup_saturation=0, store_format="json",
+                   start_method="forkserver", planner=None, refresh=False, max_age_days=7, max_failures=3,
+                   worker_max_tasks=None, worker_max_rss_mb=None, worker_kill_rss_mb=None):
+    """
+    Crawls the evidence of every pending claim, fetching each unique normalized
+    URL once. A claim's file is written as soon as all of its URLs are crawled,
+    and page text is dropped once no pending claim still needs it.
+    URLs are dispatched by a per-domain politeness scheduler whose final
+    backoff state is written to domain_report.
+
+    engine="pool" crawls each URL end to end in a multiprocessing pool;
+    engine="pipeline" streams async fetches into a process pool for extraction.
+
+    Every crawled URL is appended to the crawl log in log_dir as soon as it is
+    done; on restart logged URLs are restored instead of crawled again. With
+    crawl=False only that restore (compaction into claim files) runs.
+
+    Per-URL stage timings and outcomes are aggregated per domain and per run
+    into metrics_path (JSON) and the same path with a .prom suffix.
+
+    The fetch method of each URL is picked from what worked for its domain in
+    this and earlier runs (kept in strategy_path; an empty path disables it),
+    re-probing a probe_rate share of URLs with the default 'auto' method.
+
+    Crawled texts are MinHash-indexed to find near-duplicate pages (dedup='mark'
+    records "duplicate_of" in claim files, 'collapse' also drops the text of
+    duplicates within a claim, 'off' disables it). The signatures are kept
+    under log_dir/near_dup, so pages are matched against those of earlier runs too. With dedup_saturation > 0, a
+    claim whose last dedup_saturation crawled URLs were all duplicates stops
+    crawling the URLs no other claim still needs.
+
+    store_format='json' writes one {claim_id}.json per claim; 'packed' adds
+    claims to the compressed, indexed KnowledgeStore in the same directory.
+
+    Pool workers are started with start_method; with 'forkserver' they are
+    forked from a parent that preloaded WORKER_PRELOAD once, so (re)starting
+    a worker doesn't import and warm up the extraction stack again. A worker is
+    recycled after worker_max_tasks tasks, or once its RSS with its Chrome
+    processes passes worker_max_rss_mb, and killed above worker_kill_rss_mb
+    (see utils.worker_pool.WorkerPool, which also reaps leaked browsers). In
+    pipeline mode extraction workers are recycled after worker_max_tasks pages.
+
+    With a utils.crawl_planner.CrawlPlanner, each claim's URLs are queued best
+    first a few at a time, and a claim stops crawling once it has the planner's
+    budget of good evidence documents.
+
+    refresh=True re-crawls incrementally: claims that already have a file are
+    rebuilt too, but only logged URLs older than max_age_days, or whose last
+    attempt failed with a retryable error (fewer than max_failures times in a
+    row), are fetched again, along with URLs new to the search results. A
+    failed re-fetch keeps the page's earlier text, and a rebuilt claim whose
+    pages all came back unchanged is not rewritten. Without refresh, logged
+    URLs whose crawl was cut short by a lost worker or a failed batch (fewer
+    than max_failures times in a row) are crawled again rather than restored.
+    """
     save_dir = "data/knowledge_store/"
 
     if not os.path.exists(save_dir):
         os.makedirs(save_dir)
 
-    processed_claims = [f for f in os.listdir(save_dir) if f.endswith(".json")]
+    knowledge_store = KnowledgeStore(save_dir) if store_format == "packed" else None
+    processed_claims = {f[:-len(".json")] for f in os.listdir(save_dir) if f.endswith(".json")}
+    if knowledge_store is not None:
+        processed_claims.update(knowledge_store.claim_ids())
     print(len(processed_claims), " claims already processed")
 
-    with multiprocessing.Pool(processes=max_processes) as pool:
-        tasks = []
-        for ix, claim_object in enumerate(dataset):            
+    claim_entries = {}
+    claim_pending = {}
+    url_claims = defaultdict(set)
+    unique_urls = {}
+    pending_claims = []
+    for claim_object in dataset:
+        if str(claim_object['claim_id']) in processed_claims and not refresh:
+            print(claim_object['claim_id'], " already processed")
+            continue
+        pending_claims.append(claim_object)
+
+    # Blacklist and normalize every pending claim's search results in one pass
+    claim_results = filter_search_results(search_results, [c['claim'] for c in pending_claims])
+    crawl_log = CrawlLog(log_dir)
+
+    # Signatures of the pages indexed by every run so far live next to the crawl log,
+    # one file per writer holding the pages it indexed
+    dedup_index = None
+    dedup_dir = os.path.join(log_dir, "near_dup")
+    dedup_path = os.path.join(dedup_dir, f"{int(time.time())}-{socket.gethostname()}-{os.getpid()}.npz")
+    dedup_added = set()
+    if dedup != "off":
+        dedup_index = NearDuplicateIndex()
+        os.makedirs(dedup_dir, exist_ok=True)
+        print(f"{dedup_index.load_dir(dedup_dir)} near-duplicate signatures loaded")
+
+    def close_stores():
+        crawl_log.close()
+        if dedup_added:
+            dedup_index.save(dedup_path, dedup_added)
+        if knowledge_store is not None:
+            knowledge_store.close()
+
+    # Refresh: URLs to fetch again (with why) and the content hash they had,
+    # and the processed claims rebuilt because one of their URLs is due
+    due = {}
+    previous_hash = {}
+    refreshed_claims = set()
+    changed_urls = set()
+    if refresh:
+        now = time.time()
+        to_update = []
+        for claim_object in pending_claims:
+            norm_urls = {normalize_url(url) for _, _, url in claim_results[claim_object['claim']]}
+            for norm_url in norm_urls - due.keys():
+                due[norm_url] = crawl_log.refresh_reason(norm_url, max_age_days * 86400, max_failures, now)
+            if str(claim_object['claim_id']) not in processed_claims:
+                to_update.append(claim_object)
+            elif any(due[norm_url] for norm_url in norm_urls):
+                to_update.append(claim_object)
+                refreshed_claims.add(claim_object['claim_id'])
+        pending_claims = to_update
+        due = {norm_url: reason for norm_url, reason in due.items() if reason}
+        for norm_url in due:
+            status = crawl_log.status(norm_url)
+            if status is not None:
+                previous_hash[norm_url] = status[1]
+        print(f"Refresh: {len(refreshed_claims)} processed claims to update, "
+              f"URLs due: {dict(Counter(due.values()))}")
+    for claim_object in pending_claims:
+        claim_id = claim_object['claim_id']
+        entries = claim_results[claim_object['claim']]
+        claim_entries[claim_id] = entries
+        claim_pending[claim_id] = set()
+        for _, _, url in entries:
+            norm_url = normalize_url(url)
+            unique_urls.setdefault(norm_url, url)
+            url_claims[norm_url].add(claim_id)
+            claim_pending[claim_id].add(norm_url)
+    if not refresh:
+        # Resume: URLs whose crawl was cut short by a lost worker are crawled again, not restored empty
+        due = {norm_url: "interrupted" for norm_url in unique_urls if crawl_log.interrupted(norm_url, max_failures)}
+        if due:
+            print(f"{len(due)} logged URLs were interrupted and are crawled again")
+
+    if planner is not None:
+        for claim_object in pending_claims:
             claim_id = claim_object['claim_id']
-            if f'{claim_id}.json' in processed_claims:
-                print(claim_id, " already processed")
+            if not claim_pending[claim_id]:
+                continue
+            planner.add_claim(claim_id, search_results, claim_object['claim'], claim_pending[claim_id])
+
+    n_refs = sum(len(entries) for entries in claim_entries.values())
+    print(f"{len(claim_entries)} claims, {n_refs} evidence URLs, {len(unique_urls)} unique")
+
+    # Claims without any crawlable result can be written right away
+    for claim_id in [c for c, pending in claim_pending.items() if not pending]:
+        save_claim_evidences(claim_id, claim_entries.pop(claim_id), {}, save_dir, store=knowledge_store)
+        del claim_pending[claim_id]
+    if not unique_urls:
+        close_stores()
+        return
+
+    url_refs = {norm_url: len(claims) for norm_url, claims in url_claims.items()}
+    texts = {}
+
+    duplicate_of = {}
+    duplicate_streak = defaultdict(int)
+    saturated = set()
+    released = set()
+
+    def find_duplicate(norm_url, lines):
+        if dedup_index is None or not lines:
+            return None
+        indexed = dedup_index.signatures.get(norm_url)
+        original = dedup_index.add(norm_url, lines)
+        if original is not None:
+            dedup_added.discard(norm_url)
+            if original in unique_urls:
+                duplicate_of[norm_url] = unique_urls[original]
+            else:
+                # Indexed by an earlier run
+                logged = crawl_log.read(original)
+                duplicate_of[norm_url] = logged["url"] if logged else original
+        elif dedup_index.signatures.get(norm_url) is not indexed:
+            dedup_added.add(norm_url)
+        return original
+
+    def record(norm_url, lines):
+        texts[norm_url] = lines
+        for claim_id in url_claims.pop(norm_url):
+            claim_pending[claim_id].discard(norm_url)
+            if claim_pending[claim_id]:
+                continue
+            entries = claim_entries.pop(claim_id)
+            del claim_pending[claim_id]
+            claim_urls = {normalize_url(url) for _, _, url in entries}
+            if claim_id in refreshed_claims and not claim_urls & changed_urls:
+                print("Claim", claim_id, "unchanged")
+            else:
+                save_claim_evidences(claim_id, entries, texts, save_dir, duplicate_of,
+                                     collapse=dedup == "collapse", store=knowledge_store)
+                print("Saved claim", claim_id)
+            for done_url in claim_urls:
+                url_refs[done_url] -= 1
+                if url_refs[done_url] == 0:
+                    del texts[done_url]
+
+    metrics = CrawlMetrics(domain_of=get_domain_name)
+    metrics_prom_path = os.path.splitext(metrics_path)[0] + ".prom"
+
+    strategy = None
+    if strategy_path:
+        strategy = FetchStrategy(strategy_path, domain_of=get_domain_name, probe_rate=probe_rate)
+
+    def write_metrics():
+        metrics.write_json(metrics_path)
+        metrics.write_prometheus(metrics_prom_path)
+        if strategy is not None:
+            strategy.save()
+
+    def saturate(claim_id, reason="with duplicates"):
+        """Stops crawling the URLs that only saturated claims still need."""
+        saturated.add(claim_id)
+        dropped = 0
+        for pending_url in list(claim_pending.get(claim_id, ())):
+            if pending_url not in url_claims or not url_claims[pending_url] <= saturated:
                 continue
+            if pending_url not in released or scheduler.discard(unique_urls[pending_url], pending_url):
+                record(pending_url, [])
+                dropped += 1
+        print(f"Claim {claim_id} saturated {reason}, dropped {dropped} URLs")
 
-            claim_search_results = search_results[claim_object['claim']]
-            tasks.append((claim_id, claim_search_results))
+    def release(claim_id):
+        """Queues the next URLs the planner picks for a claim."""
+        pending = claim_pending.get(claim_id)
+        if pending is None:
+            return
+        in_flight = sum(1 for pending_url in pending if pending_url in released)
+        while True:
+            batch = planner.next_urls(claim_id, in_flight)
+            if not batch:
+                return
+            for norm_url in batch:
+                if norm_url in pending and norm_url not in released:
+                    released.add(norm_url)
+                    scheduler.add(unique_urls[norm_url], norm_url)
+                    in_flight += 1
 
-        if tasks:
-            pool.starmap(crawl_claim_evidences, tasks)
+    def credit(norm_url, lines, is_duplicate):
+        """Claims of norm_url that just met the planner's evidence budget."""
+        if planner is None:
+            return []
+        return [claim_id for claim_id in url_claims[norm_url]
+                if planner.credit(claim_id, lines, is_duplicate) and claim_id not in saturated]
+
+    def on_crawled(norm_url, lines, trace):
+        fetched_at = None
+        if not lines and previous_hash.get(norm_url):
+            # Keep the text of a page whose re-fetch failed; it stays due for the next refresh
+            previous = crawl_log.read(norm_url)
+            if previous:
+                lines, fetched_at = previous["text"], previous.get("fetched_at")
+        crawl_log.append(norm_url, unique_urls[norm_url], lines, method=trace["method"],
+                         failure=trace["failure"], bytes=trace["bytes"], fetched_at=fetched_at)
+        page_hash = content_hash(lines) if lines else ""
+        if page_hash != previous_hash.get(norm_url):
+            changed_urls.add(norm_url)
+        metrics.add(trace)
+        if strategy is not None:
+            strategy.observe(trace)
+        is_duplicate = find_duplicate(norm_url, lines) is not None
+        claims = set(url_claims[norm_url])
+        newly_saturated = []
+        if dedup_saturation and lines:
+            for claim_id in claims:
+                duplicate_streak[claim_id] = duplicate_streak[claim_id] + 1 if is_duplicate else 0
+                if duplicate_streak[claim_id] >= dedup_saturation and claim_id not in saturated:
+                    newly_saturated.append(claim_id)
+        satisfied = credit(norm_url, lines, is_duplicate)
+        record(norm_url, lines)
+        for claim_id in newly_saturated:
+            saturate(claim_id)
+        for claim_id in satisfied:
+            if claim_id in claim_pending:
+                saturate(claim_id, "with enough evidence")
+        if planner is not None:
+            for claim_id in claims:
+                release(claim_id)
+        if metrics.run.urls % 500 == 0:
+            write_metrics()
+
+    # Interleave domains and respect per-domain delay/concurrency instead of
+    # crawling in the order of each claim's queries and results
+    scheduler = CrawlScheduler(min_delay=domain_delay, max_per_domain=max_per_domain,
+                               domain_of=get_domain_name)
+
+    # Resume: fan out URLs finished by earlier runs, crawl only the rest
+    restored = [norm_url for norm_url in unique_urls if norm_url in crawl_log and norm_url not in due]
+    satisfied = []
+    for norm_url in restored:
+        logged = crawl_log.read(norm_url)
+        lines = logged["text"] if logged else []
+        satisfied += credit(norm_url, lines, find_duplicate(norm_url, lines) is not None)
+        record(norm_url, lines)
+    print(f"{len(restored)} URLs restored from the crawl log, {len(unique_urls) - len(restored)} to crawl")
+    if not crawl:
+        print(f"{len(claim_entries)} claims still have uncrawled URLs")
+        close_stores()
+        return
+
+    for claim_id in satisfied:
+        if claim_id in claim_pending:
+            saturate(claim_id, "with enough evidence")
+    if planner is None:
+        for norm_url, url in unique_urls.items():
+            if norm_url not in crawl_log or norm_url in due:
+                released.add(norm_url)
+                scheduler.add(url, norm_url)
+    else:
+        for claim_id in list(claim_pending):
+            release(claim_id)
+    if not scheduler.pending():
+        close_stores()
+        return
+
+    if engine == "pipeline":
+        processor = make_processor(**(processor_options or {}))
+        pipeline = CrawlPipeline(processor, fetch_concurrency=max_concurrency, max_per_host=max_per_host,
+                                 extract_workers=max_processes, render_workers=render_workers,
+                                 url_budget=timeout, strategy=strategy, extract_max_tasks=worker_max_tasks)
+        try:
+            pipeline.run(scheduler, on_crawled)
+        finally:
+            cleanup_processor(processor)
+            close_stores()
+            write_metrics()
+            with open(domain_report, "w") as f:
+                json.dump(scheduler.backoff_report(), f, indent=2)
+        return
+
+    batch_size = max_concurrency if fetch_mode == "async" else 1
+    max_tasks = max_processes * 2
+    results = queue.Queue()
+    n_tasks = 0
+    n_done = 0
+
+    context = multiprocessing.get_context(start_method)
+    if start_method == "forkserver":
+        context.set_forkserver_preload(WORKER_PRELOAD)
+    pool = WorkerPool(max_processes, initializer=init_crawl_worker, initargs=(processor_options or {},),
+                      max_tasks=worker_max_tasks, max_rss_mb=worker_max_rss_mb,
+                      kill_rss_mb=worker_kill_rss_mb, context=context)
+    try:
+        while scheduler.pending() or n_tasks:
+            while n_tasks < max_tasks:
+                batch = scheduler.next_batch(batch_size)
+                if not batch:
+                    break
+                url_items = []
+                methods = {}
+                for url, norm_url in batch:
+                    method = strategy.choose(url) if strategy is not None else "auto"
+                    if method == "skip":
+                        scheduler.done(url, ok=True)
+                        on_crawled(norm_url, [], skipped_trace(url))
+                        continue
+                    url_items.append((norm_url, url))
+                    methods[url] = method
+                if not url_items:
+                    continue
+                pool.apply_async(
+                    crawl_url_batch, (url_items, timeout, fetch_mode, max_concurrency, max_per_host, methods),
+                    callback=results.put,
+                    error_callback=lambda e, url_items=url_items: results.put(lost_batch(url_items, e)))
+                n_tasks += 1
+            if not n_tasks and not scheduler.pending():
+                break  # the last URLs were all skipped
+
+            try:
+                crawled = results.get(timeout=scheduler.wait_time() if n_tasks < max_tasks else None)
+            except queue.Empty:
+                continue
+            n_tasks -= 1
+            for norm_url, lines, trace in crawled:
+                scheduler.done(unique_urls[norm_url], ok=bool(lines))
+                on_crawled(norm_url, lines, trace)
+                n_done += 1
+                if n_done % 500 == 0:
+                    print(f"{n_done}/{len(unique_urls) - len(restored)} URLs crawled, "
+                          f"{len(scheduler.backing_off())} domains backing off")
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        print(f"Worker pool: {pool.stats()}")
+        close_stores()
+        write_metrics()
+        with open(domain_report, "w") as f:
+            json.dump(scheduler.backoff_report(), f, indent=2)
+
+def crawl_from_queue(work_queue, dataset, search_results, max_processes, claims_per_lease=50,
+                     poll_interval=30, **process_kwargs):
+    """
+    Distributed crawl: every node runs this against one shared WorkQueue and a
+    shared data directory. The queue is seeded with the claims of dataset (claims
+    queued already are left alone, so every node can run the same command), then
+    claims are leased claims_per_lease at a time and crawled with process_claims
+    while a heartbeat keeps the leases alive. Claim files, packed store shards and
+    the crawl log are written per writer, so all nodes merge into one knowledge
+    store, and a claim re-issued after a node died resumes from the crawl log.
+    Returns once no claim is left pending or leased by a live worker.
+    """
+    claims = {str(claim_object['claim_id']): claim_object for claim_object in dataset}
+    added = work_queue.put(list(claims))
+    print(f"Worker {work_queue.worker_id}: queued {added} new claims, {work_queue.counts()}")
+    while True:
+        leased = work_queue.lease(claims_per_lease)
+        if not leased:
+            counts = work_queue.counts()
+            if not counts["pending"] and not counts["leased"] and not counts["expired"]:
+                break
+            print(f"No claim to lease, waiting for other workers: {counts}")
+            time.sleep(poll_interval)
+            continue
+        batch = [claims[claim_id] for claim_id in leased if claim_id in claims]
+        try:
+            with work_queue.keep_alive(leased):
+                process_claims(batch, search_results, max_processes, **process_kwargs)
+        except Exception as e:
+            print(f"Crawling {len(leased)} leased claims failed: {e!r}")
+            work_queue.release(leased, error=repr(e))
+            continue
+        work_queue.complete(leased)
+        print(f"Worker {work_queue.worker_id}: completed {len(leased)} claims, {work_queue.counts()}")
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--max_processes', type=int, default=16,
                        help='Maximum number of processes to use')
+    parser.add_argument('--queue', type=str, default=None,
+                       help='SQLite work queue shared by several crawl nodes (distributed mode; nodes must '
+                            'share the data directory)')
+    parser.add_argument('--worker_id', type=str, default=None,
+                       help='Name of this node in the work queue (default: host-pid)')
+    parser.add_argument('--claims_per_lease', type=int, default=50,
+                       help='Claims leased and crawled per batch in distributed mode')
+    parser.add_argument('--lease_seconds', type=int, default=600,
+                       help='Lease length; leases are renewed every third of it and re-issued once expired')
+    parser.add_argument('--engine', choices=['pool', 'pipeline'], default='pool',
+                       help='pool crawls URLs end to end per worker; pipeline decouples async fetching '
+                            'from process-pool extraction (--max_processes extraction workers, '
+                            '--max_concurrency fetchers)')
+    parser.add_argument('--start_method', choices=['forkserver', 'fork', 'spawn'], default='forkserver',
+                       help='How pool workers are started; forkserver forks them from a preloaded parent')
+    parser.add_argument('--worker_max_tasks', type=int, default=0,
+                       help='Replace a crawl worker after this many tasks (one task is one URL in sync mode; '
+                            '0: only recycle by RSS, leaving Chrome churn to --browser_max_pages)')
+    parser.add_argument('--worker_max_rss_mb', type=int, default=3000,
+                       help='Replace a crawl worker once it and its browser processes use more than this RSS '
+                            'after a task (0 disables)')
+    parser.add_argument('--worker_kill_rss_mb', type=int, default=6000,
+                       help='Kill a crawl worker mid-task above this RSS; its URLs are logged as failed with '
+                            '"worker_lost" (0 disables)')
+    parser.add_argument('--render_workers', type=int, default=2,
+                       help='Selenium render threads in pipeline mode')
+    parser.add_argument('--fetch_mode', choices=['sync', 'async'], default='sync',
+                       help='sync fetches one URL at a time; async keeps many requests in flight per worker')
+    parser.add_argument('--max_concurrency', type=int, default=32,
+                       help='Maximum in-flight requests per worker in async mode')
+    parser.add_argument('--max_per_host', type=int, default=4,
+                       help='Maximum in-flight requests per host in async mode')
+    parser.add_argument('--domain_delay', type=float, default=1.0,
+                       help='Minimum seconds between requests to one domain')
+    parser.add_argument('--max_per_domain', type=int, default=2,
+                       help='Maximum concurrent crawl tasks per domain')
+    parser.add_argument('--log_dir', type=str, default='data/crawl_log',
+                       help='Directory of the per-URL crawl log used for checkpointing and resume')
+    parser.add_argument('--metrics_path', type=str, default='data/crawl_metrics.json',
+                       help='Per-run and per-domain crawl metrics (JSON; a .prom text file is written next to it)')
+    parser.add_argument('--strategy_path', type=str, default='data/fetch_strategy.json',
+                       help='Per-domain fetch-method stats carried across runs (empty string disables)')
+    parser.add_argument('--probe_rate', type=float, default=0.1,
+                       help='Share of URLs crawled with the default method to re-probe learned domains')
+    parser.add_argument('--search_results', type=str, default='data/search_results.json',
+                       help='Nested search results JSON (claim -> query -> page -> results)')
+    parser.add_argument('--search_store', type=str, default='data/search_store',
+                       help='Columnar search-results store, built from --search_results if missing')
+    parser.add_argument('--dedup', choices=['off', 'mark', 'collapse'], default='mark',
+                       help='Near-duplicate pages (of pages crawled by this or earlier runs, whose signatures are '
+                            'kept under {log_dir}/near_dup): mark them with "duplicate_of", or also drop their '
+                            'text when the original is evidence of the same claim')
+    parser.add_argument('--dedup_saturation', type=int, default=0,
+                       help='Stop crawling a claim after this many near-duplicates in a row (0 disables)')
+    parser.add_argument('--store_format', choices=['json', 'packed'], default='json',
+                       help='json: one {claim_id}.json per claim; packed: compressed shards indexed by '
+                            'claim and URL (see utils/knowledge_store.py, which also migrates json stores)')
+    parser.add_argument('--evidence_budget', type=int, default=0,
+                       help='Crawl each claim\'s results best first (rank, snippet overlap with the claim and '
+                            'its queries, domain) and stop after this many good documents (0 crawls all)')
+    parser.add_argument('--budget_overfetch', type=int, default=2,
+                       help='Extra URLs per claim kept in flight beyond what its evidence budget still needs')
+    parser.add_argument('--min_evidence_words', type=int, default=50,
+                       help='Words a crawled page needs to count towards the evidence budget')
+    parser.add_argument('--domain_scores', type=str, default=None,
+                       help='JSON {domain: score in [0, 1]} used as the domain prior of the evidence budget')
+    parser.add_argument('--refresh', action='store_true',
+                       help='Incremental re-crawl: also update processed claims, fetching only logged URLs '
+                            'that are stale or failed with a retryable error, and URLs new to the search results')
+    parser.add_argument('--max_age_days', type=float, default=7,
+                       help='Age after which --refresh fetches a logged page again')
+    parser.add_argument('--max_failures', type=int, default=3,
+                       help='Consecutive retryable failures after which --refresh waits for a URL to go stale (and a '
+                            'resume stops re-crawling URLs lost with their worker)')
+    parser.add_argument('--compact_only', action='store_true',
+                       help='Only write claim files from URLs already in the crawl log, without crawling')
+    parser.add_argument('--page_cache_dir', type=str, default=None,
+                       help='Directory of the raw-page cache (disabled when not set)')
+    parser.add_argument('--page_cache_gb', type=float, default=20,
+                       help='Size bound of the raw-page cache in GB')
+    parser.add_argument('--browser_pool_size', type=int, default=1,
+                       help='Warm Chrome drivers kept per worker for the Selenium fallback (0 disables the pool)')
+    parser.add_argument('--browser_max_pages', type=int, default=200,
+                       help='Recycle a pooled driver after this many pages')
+    parser.add_argument('--browser_max_rss_mb', type=int, default=1500,
+                       help='Recycle a pooled driver once its process tree exceeds this RSS')
+    parser.add_argument('--warm_browsers', action='store_true',
+                       help='Start pooled drivers when a worker starts instead of on first use')
+    parser.add_argument('--render_mode', choices=['fast', 'thorough'], default='fast',
+                       help='fast: one-pass consent dismissal, adaptive scrolling and blocked fonts/media/trackers; '
+                            'thorough: XPath cookie-popup search, fixed scroll pauses, full page loads')
+    parser.add_argument('--cache_mode', choices=['revalidate', 'prefer'], default='revalidate',
+                       help='revalidate cached pages with conditional requests, or serve them as is')
     args = parser.parse_args()
 
     with open("data/dataset_politifact.json", "r") as f:
         dataset = json.load(f)
 
-    with open("data/search_results.json", "r") as f:
-        search_results = json.load(f)
-    process_claims(dataset, search_results, args.max_processes)
+    # Columnar, memory-mapped search results; converted from the JSON on first use
+    search_results = load_search_results(args.search_results, args.search_store, dataset)
+    processor_options = {
+        "page_cache_dir": args.page_cache_dir,
+        "page_cache_gb": args.page_cache_gb,
+        "cache_mode": args.cache_mode,
+        "browser_pool_size": args.browser_pool_size,
+        "browser_max_pages": args.browser_max_pages,
+        "browser_max_rss_mb": args.browser_max_rss_mb,
+        "warm_browsers": args.warm_browsers,
+        "render_mode": args.render_mode,
+    }
+    planner = None
+    if args.evidence_budget > 0:
+        domain_scores = CrawlPlanner.load_domain_scores(args.domain_scores) if args.domain_scores else None
+        planner = CrawlPlanner(budget=args.evidence_budget, overfetch=args.budget_overfetch,
+                               min_words=args.min_evidence_words, domain_scores=domain_scores)
+    process_kwargs = dict(
+        fetch_mode=args.fetch_mode, max_concurrency=args.max_concurrency, max_per_host=args.max_per_host,
+        processor_options=processor_options, domain_delay=args.domain_delay,
+        max_per_domain=args.max_per_domain, engine=args.engine, render_workers=args.render_workers,
+        log_dir=args.log_dir, crawl=not args.compact_only, metrics_path=args.metrics_path,
+        strategy_path=args.strategy_path, probe_rate=args.probe_rate,
+        dedup=args.dedup, dedup_saturation=args.dedup_saturation,
+        store_format=args.store_format, start_method=args.start_method, planner=planner,
+        refresh=args.refresh, max_age_days=args.max_age_days, max_failures=args.max_failures,
+        worker_max_tasks=args.worker_max_tasks or None, worker_max_rss_mb=args.worker_max_rss_mb or None,
+        worker_kill_rss_mb=args.worker_kill_rss_mb or None)
+    if args.queue is None:
+        process_claims(dataset, search_results, args.max_processes, **process_kwargs)
+        return
+
+    work_queue = WorkQueue(args.queue, lease_seconds=args.lease_seconds, worker_id=args.worker_id)
+    # Per-node reports, so that nodes don't overwrite each other's
+    root, ext = os.path.splitext(args.metrics_path)
+    process_kwargs["metrics_path"] = f"{root}.{work_queue.worker_id}{ext}"
+    process_kwargs["domain_report"] = f"data/crawl_domains.{work_queue.worker_id}.json"
+    try:
+        crawl_from_queue(work_queue, dataset, search_results, args.max_processes,
+                         claims_per_lease=args.claims_per_lease, **process_kwargs)
+    finally:
+        work_queue.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,235 @@
+import queue
+import sys
+import threading
+from contextlib import contextmanager
+
+from utils.worker_pool import kill_processes, process_tree, tree_rss
+
+
+# Requests Chrome drops in 'fast' render mode (DevTools Network.setBlockedURLs wildcards):
+# fonts, media and the usual ad/tracker hosts, none of which carry article text.
+# Images are already disabled through the browser prefs.
+BLOCKED_URL_PATTERNS = [
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.m3u8", "*.mp3", "*.ogg", "*.wav", "*.mov",
+    "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*googletagservices.com*",
+    "*adservice.google.*", "*amazon-adsystem.com*", "*connect.facebook.net*",
+    "*scorecardresearch.com*", "*quantserve.com*", "*taboola.com*", "*outbrain.com*",
+    "*criteo.com*", "*criteo.net*", "*adnxs.com*", "*rubiconproject.com*", "*pubmatic.com*",
+    "*moatads.com*", "*hotjar.com*", "*chartbeat.com*", "*newrelic.com*", "*nr-data.net*",
+]
+
+
+def block_resources(driver, patterns=BLOCKED_URL_PATTERNS):
+    """Makes Chrome fail requests matching patterns before they hit the network."""
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+
+def create_driver(render_mode="fast"):
+    """
+    Starts a headless Chrome configured for crawling. Raises WebDriverException on failure.
+    render_mode='fast' returns from page loads at DOMContentLoaded and blocks
+    heavy resources; 'thorough' waits for the full load event and loads everything.
+    """
+    # Imported here so that processes which never render a page don't load Selenium
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    if render_mode == "fast":
+        chrome_options.page_load_strategy = "eager"
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument('--disable-notifications')
+    chrome_options.add_argument('--ignore-certificate-errors')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+    chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+    chrome_options.add_argument('--disable-animations')
+    # chrome_options.add_argument('--disable-javascript')  # Disable JavaScript if not needed
+    prefs = {
+        "profile.default_content_setting_values.notifications": 2,
+        "profile.managed_default_content_settings.images": 2,  # Changed from 1 to 2 to disable images
+        # "profile.managed_default_content_settings.javascript": 2,  # Disable JavaScript
+    }
+    chrome_options.add_experimental_option("prefs", prefs)
+
+    driver = webdriver.Chrome(options=chrome_options)
+    # Prevent detection
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    driver.execute_cdp_cmd('Network.setUserAgentOverride', {
+        "userAgent": 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+                    'AppleWebKit/537.36 (KHTML, like Gecko) '
+                    'Chrome/131.0.0.0 Safari/537.36'
+    })
+    if render_mode == "fast":
+        block_resources(driver)
+    return driver
+
+
+def _driver_tree(driver):
+    try:
+        return process_tree(driver.service.process.pid)
+    except AttributeError:
+        return []
+
+
+def driver_rss(driver):
+    """Resident memory in bytes of chromedriver plus all Chrome processes it spawned."""
+    return tree_rss(_driver_tree(driver))
+
+
+def quit_driver(driver):
+    """Quits a driver, then kills whatever of its chromedriver / Chrome process tree survived."""
+    tree = _driver_tree(driver)
+    try:
+        driver.quit()
+    except Exception:
+        pass
+    killed = kill_processes(tree)
+    if killed:
+        print(f"Killed {killed} browser processes left after quit", file=sys.stderr)
+
+
+class BrowserPool:
+    """
+    Fixed-size pool of warm headless Chrome drivers that are leased to callers.
+
+    A driver is health-checked when leased, reset to a blank tab after a failed
+    page instead of being restarted, and recycled (quit and replaced lazily)
+    after max_pages pages or once its process tree uses more than max_rss_mb.
+    The pool is thread-safe; with multiprocessing each worker owns one pool.
+    """
+    def __init__(self, size=1, max_pages=200, max_rss_mb=1500, lease_timeout=120, render_mode="fast"):
+        self.size = size
+        self.render_mode = render_mode
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.lease_timeout = lease_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._pages = {}
+        self._broken = set()
+        self.launches = 0
+
+    def warm(self, n=None):
+        """Starts up to n (default: size) drivers ahead of the first lease."""
+        for _ in range(self.size if n is None else n):
+            driver = self._create()
+            if driver is None:
+                break
+            self._idle.put(driver)
+
+    def _create(self):
+        from selenium.common.exceptions import WebDriverException
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            driver = create_driver(self.render_mode)
+        except WebDriverException as e:
+            print(f"Error initializing WebDriver: {e}", file=sys.stderr)
+            with self._lock:
+                self._created -= 1
+            return None
+        self.launches += 1
+        self._pages[id(driver)] = 0
+        print("Initialized driver", file=sys.stderr)
+        return driver
+
+    def _discard(self, driver):
+        quit_driver(driver)
+        self._pages.pop(id(driver), None)
+        self._broken.discard(id(driver))
+        with self._lock:
+            self._created -= 1
+
+    @staticmethod
+    def is_healthy(driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                driver = self._create()
+                if driver is None:
+                    if self._created == 0:
+                        return None
+                    try:
+                        driver = self._idle.get(timeout=self.lease_timeout)
+                    except queue.Empty:
+                        return None
+            if self.is_healthy(driver):
+                return driver
+            print("Discarding unhealthy driver", file=sys.stderr)
+            self._discard(driver)
+
+    def _release(self, driver):
+        self._pages[id(driver)] = self._pages.get(id(driver), 0) + 1
+        if id(driver) in self._broken and not self.reset_tab(driver):
+            self._discard(driver)
+            return
+        self._broken.discard(id(driver))
+
+        if self._pages[id(driver)] >= self.max_pages:
+            print("Recycling driver after", self._pages[id(driver)], "pages", file=sys.stderr)
+            self._discard(driver)
+            return
+        if driver_rss(driver) > self.max_rss_mb * 1024**2:
+            print("Recycling driver over memory limit", file=sys.stderr)
+            self._discard(driver)
+            return
+        self._idle.put(driver)
+
+    @contextmanager
+    def lease(self):
+        """Yields a healthy driver (or None if Chrome can't be started) and returns it afterwards."""
+        driver = self._acquire()
+        try:
+            yield driver
+        finally:
+            if driver is not None:
+                self._release(driver)
+
+    def mark_stale(self, driver):
+        """Flags a driver whose last page failed; its tab is reset when the lease ends."""
+        self._broken.add(id(driver))
+
+    @staticmethod
+    def reset_tab(driver):
+        """Closes extra windows and loads a blank page. Returns False if the browser is unusable."""
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            driver.get("about:blank")
+            driver.delete_all_cookies()
+            return True
+        except Exception as e:
+            print(f"Tab reset failed: {e}", file=sys.stderr)
+            return False
+
+    def close(self):
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
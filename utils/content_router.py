@@ -0,0 +1,101 @@
+# filetype reads this much of a file; Office formats need it to see past the zip header
+SNIFF_BYTES = 8192
+
+DOC_EXTENSIONS = ('.pdf', '.txt', '.docx')
+
+# Largest (decompressed) body read per route; bigger responses are abandoned mid-download.
+# These bound what a crawl worker holds in memory for a single URL.
+MAX_BYTES = {
+    "html": 10000000,
+    "document": 50000000,
+}
+
+# Types pymupdf can extract text from
+DOCUMENT_MIME_TYPES = {
+    "application/pdf",
+    "application/epub+zip",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "text/plain",
+}
+
+HTML_MIME_TYPES = {
+    "text/html",
+    "application/xhtml+xml",
+    "application/xml",
+    "text/xml",
+}
+
+SKIP_MIME_PREFIXES = ("image/", "video/", "audio/", "font/")
+
+SKIP_MIME_TYPES = {
+    "application/zip",
+    "application/gzip",
+    "application/x-tar",
+    "application/x-7z-compressed",
+    "application/x-rar-compressed",
+    "application/vnd.rar",
+    "application/x-bzip2",
+    "application/x-xz",
+    "application/x-msdownload",
+    "application/x-shockwave-flash",
+    "application/vnd.ms-fontobject",
+    "application/wasm",
+}
+
+
+class NotHtml(Exception):
+    """
+    Raised by fetchers for responses that must not go through HTML extraction
+    (or the Selenium fallback): route is 'document', with the downloaded bytes
+    in data, or 'skip' for content we can't use, with reason saying why.
+    """
+    def __init__(self, url, route, content_type=None, data=None, reason="unsupported_content"):
+        super().__init__(f"{route} content ({content_type or 'unknown type'}, {reason}): {url}")
+        self.url = url
+        self.route = route
+        self.content_type = content_type
+        self.data = data
+        self.reason = reason
+
+
+def declared_size(headers):
+    """Content-Length of a response (0 if missing). Compressed bodies only grow when decoded."""
+    try:
+        return int(headers.get("Content-Length") or 0)
+    except ValueError:
+        return 0
+
+
+def _mime_route(mime):
+    if mime in DOCUMENT_MIME_TYPES:
+        return "document"
+    if mime in HTML_MIME_TYPES:
+        return "html"
+    if mime.startswith(SKIP_MIME_PREFIXES) or mime in SKIP_MIME_TYPES:
+        return "skip"
+    return None
+
+
+def route_response(url, content_type, head):
+    """
+    Decides how to extract a response from its Content-Type and first bytes:
+    'html' (trafilatura), 'document' (pymupdf) or 'skip'.
+    Magic bytes win over the header, which servers often get wrong.
+    """
+    import filetype
+    kind = filetype.guess(head) if head else None
+    if kind is not None:
+        # filetype only knows binary formats, so anything it recognises besides documents is skipped
+        if kind.mime == "application/zip" and url.lower().split("?")[0].endswith(".docx"):
+            return "document"
+        return _mime_route(kind.mime) or "skip"
+
+    mime = (content_type or "").split(";")[0].strip().lower()
+    route = _mime_route(mime)
+    if route is not None:
+        return route
+    if head.lstrip()[:1] == b"<":
+        return "html"
+    if url.lower().split("?")[0].endswith(DOC_EXTENSIONS):
+        return "document"
+    return "html"
@@ -0,0 +1,160 @@
+import glob
+import hashlib
+import json
+import os
+import socket
+import sys
+import time
+
+# Failures that a later attempt won't fix (the page is too big, not text, or has no extractable text)
+PERMANENT_FAILURES = {"too_large", "unsupported_content", "empty_extraction", "doc_failed", "extraction_failed"}
+# Failures where the URL's crawl was cut short (its worker died or its batch failed) rather than attempted
+INTERRUPTED_FAILURES = {"worker_lost", "batch_failed"}
+
+
+def content_hash(lines):
+    return hashlib.blake2b("\n".join(lines).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CrawlLog:
+    """
+    Append-only log of crawled URLs, written as JSONL shards under log_dir.
+
+    Every writer gets its own shard (<host>-<pid>-<time>.jsonl) and flushes
+    each record as soon as its URL is done, together with a line in a
+    sidecar index (<shard>.idx: "url_key<TAB>byte offset<TAB>fetched at<TAB>
+    content hash<TAB>failure<TAB>consecutive failures"). On restart only
+    the indexes are read to find the URLs that are already done and how fresh
+    they are, and records are read back by offset when a claim file is
+    compacted. A record whose index line never made it to disk is simply
+    crawled again.
+    """
+    def __init__(self, log_dir="data/crawl_log"):
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+        # url_key -> (fetched_at, content hash, failure, consecutive failures)
+        self.meta = {}
+        self.index = self._load_index()
+        self._data = None
+        self._idx = None
+        self._offset = 0
+        self._readers = {}
+
+    def _load_index(self):
+        index = {}
+        # Shard names start with their creation time, so later records win
+        for idx_path in sorted(glob.glob(os.path.join(self.log_dir, "*.idx")),
+                               key=lambda p: int(os.path.basename(p).split("-")[0])):
+            data_path = idx_path[:-len(".idx")] + ".jsonl"
+            with open(idx_path) as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # torn write at the end of the index
+                    fields = line.rstrip("\n").split("\t")
+                    if len(fields) < 2 or not fields[0] or not fields[1].isdigit():
+                        continue
+                    index[fields[0]] = (data_path, int(fields[1]))
+                    if len(fields) == 6:
+                        self.meta[fields[0]] = (float(fields[2]), fields[3], fields[4] or None, int(fields[5]))
+                    else:
+                        self.meta.pop(fields[0], None)  # written before the index kept freshness fields
+        return index
+
+    def __contains__(self, url_key):
+        return url_key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _open_shard(self):
+        name = f"{int(time.time())}-{socket.gethostname()}-{os.getpid()}"
+        data_path = os.path.join(self.log_dir, name + ".jsonl")
+        self._data = open(data_path, "ab")
+        self._idx = open(os.path.join(self.log_dir, name + ".idx"), "a")
+        self._data_path = data_path
+        self._offset = self._data.tell()
+
+    def append(self, url_key, url, lines, failure=None, fetched_at=None, **fields):
+        """
+        Logs one crawled URL and flushes it to disk right away. fetched_at is
+        when lines were fetched (now by default; older for text kept from an
+        earlier record after a failed re-fetch).
+        """
+        if self._data is None:
+            self._open_shard()
+        fetched_at = fetched_at or time.time()
+        page_hash = content_hash(lines) if lines else ""
+        failures = (self.status(url_key) or (0, "", None, 0))[3] + 1 if failure else 0
+        record = {"url_key": url_key, "url": url, "fetched_at": fetched_at, "failure": failure,
+                  "content_hash": page_hash, "failures": failures, **fields, "text": lines}
+        data = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        self._data.write(data)
+        self._data.flush()
+        # The index line is written after the data, so it never points at a partial record
+        self._idx.write(f"{url_key}\t{self._offset}\t{fetched_at:.0f}\t{page_hash}\t{failure or ''}\t{failures}\n")
+        self._idx.flush()
+        self.index[url_key] = (self._data_path, self._offset)
+        self.meta[url_key] = (fetched_at, page_hash, failure, failures)
+        self._offset += len(data)
+
+    def status(self, url_key):
+        """(fetched_at, content hash, failure, consecutive failures) of the latest record, or None."""
+        if url_key not in self.index:
+            return None
+        if url_key not in self.meta:
+            # Older record: take what it has from the record itself
+            record = self.read(url_key) or {}
+            lines = record.get("text") or []
+            self.meta[url_key] = (record.get("fetched_at", 0.0), content_hash(lines) if lines else "",
+                                  record.get("failure"), 1 if record.get("failure") else 0)
+        return self.meta[url_key]
+
+    def refresh_reason(self, url_key, max_age, max_failures=3, now=None):
+        """
+        Why url_key should be crawled again: 'new' (never logged), 'stale' (older
+        than max_age seconds) or 'retry' (failed with a retryable error fewer than
+        max_failures times in a row); None while its record is still good.
+        """
+        status = self.status(url_key)
+        if status is None:
+            return "new"
+        fetched_at, page_hash, failure, failures = status
+        if failure and failure not in PERMANENT_FAILURES and failures < max_failures:
+            return "retry"
+        if (now or time.time()) - fetched_at > max_age:
+            return "stale"
+        return None
+
+    def interrupted(self, url_key, max_failures=3):
+        """
+        Whether the latest attempt at url_key was cut short (INTERRUPTED_FAILURES)
+        and it failed fewer than max_failures times in a row, so that a resume
+        should crawl it again instead of restoring it.
+        """
+        status = self.status(url_key)
+        return status is not None and status[2] in INTERRUPTED_FAILURES and status[3] < max_failures
+
+    def read(self, url_key):
+        """Returns the latest logged record for url_key, or None."""
+        location = self.index.get(url_key)
+        if location is None:
+            return None
+        data_path, offset = location
+        reader = self._readers.get(data_path)
+        if reader is None:
+            if self._data is not None and data_path == self._data_path:
+                self._data.flush()
+            reader = self._readers[data_path] = open(data_path, "rb")
+        reader.seek(offset)
+        try:
+            return json.loads(reader.readline())
+        except ValueError:
+            print(f"Corrupt crawl log record for {url_key}", file=sys.stderr)
+            return None
+
+    def close(self):
+        for handle in [self._data, self._idx, *self._readers.values()]:
+            if handle is not None:
+                handle.close()
+        self._data = self._idx = None
+        self._readers = {}
@@ -0,0 +1,231 @@
+import contextvars
+import json
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class UrlTrace:
+    """Timings and outcome of crawling one URL."""
+    def __init__(self, url):
+        self.url = url
+        self.stages = defaultdict(float)
+        self.method = None
+        self.bytes = 0
+        self.lines = 0
+        self.failure = None
+
+    def as_dict(self):
+        return {
+            "url": self.url,
+            "method": self.method,
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "failure": self.failure,
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+        }
+
+
+# Same scoping as utils.deadline: per thread, copied into asyncio tasks
+_current_trace = contextvars.ContextVar("crawl_trace", default=None)
+_collector = contextvars.ContextVar("crawl_trace_collector", default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def collect_traces():
+    """Collects {url: UrlTrace} for every trace_url opened inside the block."""
+    traces = {}
+    token = _collector.set(traces)
+    try:
+        yield traces
+    finally:
+        _collector.reset(token)
+
+
+@contextmanager
+def use_trace(trace):
+    """Makes an existing trace current, e.g. in a thread that continues work on a URL."""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def trace_url(url):
+    """Traces the enclosed block as work on url; reopening a collected url keeps adding to it."""
+    collector = _collector.get()
+    trace = collector.get(url) if collector is not None else None
+    if trace is None:
+        trace = UrlTrace(url)
+        if collector is not None:
+            collector[url] = trace
+    start = perf_counter()
+    with use_trace(trace):
+        try:
+            yield trace
+        except Exception as e:
+            trace.failure = trace.failure or type(e).__name__
+            raise
+        finally:
+            trace.stages["total"] += perf_counter() - start
+
+
+@contextmanager
+def stage(name):
+    """Adds the time spent in the block to stage name of the current trace (no-op without one)."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        trace.stages[name] += perf_counter() - start
+
+
+def note(**fields):
+    """Sets fields (method, bytes, lines, failure) on the current trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    for name, value in fields.items():
+        setattr(trace, name, value)
+
+
+def fail(reason):
+    """Records why the current URL failed, keeping the first reason given."""
+    trace = _current_trace.get()
+    if trace is not None and trace.failure is None:
+        trace.failure = reason
+
+
+def finish_trace(trace, url, lines, failure="empty_extraction"):
+    """
+    Returns the final dict for a URL's trace (creating an empty one if it was never traced).
+    A URL without lines whose trace has no failure yet is recorded as failing with failure.
+    """
+    trace = trace or UrlTrace(url)
+    trace.lines = len(lines)
+    if not lines and trace.failure is None:
+        trace.failure = failure
+    return trace.as_dict()
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class _Summary:
+    def __init__(self):
+        self.urls = 0
+        self.ok = 0
+        self.bytes = 0
+        self.lines = 0
+        self.failures = Counter()
+        self.methods = Counter()
+        self.stage_times = defaultdict(list)
+
+    def add(self, trace):
+        self.urls += 1
+        self.ok += trace["lines"] > 0
+        self.bytes += trace["bytes"] or 0
+        self.lines += trace["lines"]
+        self.methods[trace["method"] or "none"] += 1
+        if trace["failure"]:
+            self.failures[trace["failure"]] += 1
+        for name, seconds in trace["stages"].items():
+            self.stage_times[name].append(seconds)
+
+    def as_dict(self):
+        return {
+            "urls": self.urls,
+            "ok": self.ok,
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "methods": dict(self.methods),
+            "failures": dict(self.failures),
+            "stages": {
+                name: {
+                    "total": round(sum(times), 3),
+                    "mean": round(sum(times) / len(times), 4),
+                    "p50": round(percentile(times, 0.5), 4),
+                    "p95": round(percentile(times, 0.95), 4),
+                    "p99": round(percentile(times, 0.99), 4),
+                }
+                for name, times in self.stage_times.items()
+            },
+        }
+
+
+class CrawlMetrics:
+    """Aggregates UrlTrace dicts into per-run and per-domain summaries."""
+    def __init__(self, domain_of):
+        self.domain_of = domain_of
+        self.started = time.time()
+        self.run = _Summary()
+        self.domains = defaultdict(_Summary)
+
+    def add(self, trace):
+        self.run.add(trace)
+        self.domains[self.domain_of(trace["url"])].add(trace)
+
+    def report(self):
+        elapsed = time.time() - self.started
+        return {
+            "started": self.started,
+            "elapsed": round(elapsed, 1),
+            "urls_per_sec": round(self.run.urls / elapsed, 3) if elapsed else 0.0,
+            "run": self.run.as_dict(),
+            "domains": {domain: summary.as_dict() for domain, summary in self.domains.items()},
+        }
+
+    def write_json(self, path):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    def write_prometheus(self, path):
+        """Writes the run summary and per-domain URL counts in Prometheus text format."""
+        run = self.run.as_dict()
+        out = [
+            "# TYPE crawl_urls_total counter",
+            f"crawl_urls_total {run['urls']}",
+            "# TYPE crawl_urls_ok_total counter",
+            f"crawl_urls_ok_total {run['ok']}",
+            "# TYPE crawl_bytes_total counter",
+            f"crawl_bytes_total {run['bytes']}",
+            "# TYPE crawl_lines_total counter",
+            f"crawl_lines_total {run['lines']}",
+            "# TYPE crawl_method_total counter",
+        ]
+        out += [f'crawl_method_total{{method="{m}"}} {n}' for m, n in run["methods"].items()]
+        out.append("# TYPE crawl_failures_total counter")
+        out += [f'crawl_failures_total{{reason="{r}"}} {n}' for r, n in run["failures"].items()]
+        out.append("# TYPE crawl_stage_seconds summary")
+        for name, times in run["stages"].items():
+            out.append(f'crawl_stage_seconds{{stage="{name}",quantile="0.5"}} {times["p50"]}')
+            out.append(f'crawl_stage_seconds{{stage="{name}",quantile="0.95"}} {times["p95"]}')
+            out.append(f'crawl_stage_seconds_sum{{stage="{name}"}} {times["total"]}')
+            out.append(f'crawl_stage_seconds_count{{stage="{name}"}} {len(self.run.stage_times[name])}')
+        out.append("# TYPE crawl_domain_urls_total counter")
+        for domain, summary in self.domains.items():
+            out.append(f'crawl_domain_urls_total{{domain="{domain}",outcome="ok"}} {summary.ok}')
+            out.append(f'crawl_domain_urls_total{{domain="{domain}",outcome="failed"}} '
+                       f'{summary.urls - summary.ok}')
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(out) + "\n")
+        os.replace(tmp_path, path)
@@ -0,0 +1,186 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils.deadline import deadline, DeadlineExceeded
+from utils.http_fetcher import AsyncFetcher
+from utils.webpage_crawler import WebpageProcessor, html2lines, document2lines
+from utils.content_router import NotHtml, DOC_EXTENSIONS
+from utils.crawl_metrics import collect_traces, use_trace, trace_url, stage, note, fail, finish_trace
+
+_DONE = object()
+
+
+def _extract_doc(url, url_budget):
+    try:
+        with deadline(url_budget):
+            # Pipeline extraction processes already fill the CPUs: no nested page-range pool
+            return WebpageProcessor().extract_doc_content(url, workers=1)
+    except DeadlineExceeded as e:
+        print(f"{e}: {url}", file=sys.stderr)
+        return []
+
+
+def _render(processor, url, url_budget, trace):
+    # Executor threads don't inherit the event loop's context, so carry the trace over
+    with use_trace(trace):
+        try:
+            with deadline(url_budget), stage("selenium"):
+                return processor.get_page_with_selenium(url)
+        except DeadlineExceeded as e:
+            fail("deadline")
+            print(f"{e}: {url}", file=sys.stderr)
+            return None
+
+
+class CrawlPipeline:
+    """
+    Streaming crawl pipeline with independently sized stages:
+
+        fetch (asyncio, I/O-bound) -> bounded queue -> extract (process pool, CPU-bound) -> writer
+
+    Fetchers pull URLs from a CrawlScheduler, so politeness rules still apply.
+    Pages the fetcher could not get are rendered by a small thread pool sharing
+    the processor's BrowserPool before extraction. The bounded queues give
+    backpressure: fetchers pause when extraction falls behind, and extraction
+    pauses when the writer does.
+    """
+    def __init__(self, processor, fetch_concurrency=64, max_per_host=4, extract_workers=None,
+                 render_workers=2, queue_size=256, url_budget=45, method='auto', strategy=None,
+                 extract_max_tasks=None):
+        self.processor = processor
+        self.fetch_concurrency = fetch_concurrency
+        self.max_per_host = max_per_host
+        self.extract_workers = extract_workers or os.cpu_count()
+        # Without a BrowserPool the processor owns a single driver, which can't be shared across threads
+        self.render_workers = render_workers if processor.browser_pool is not None else 1
+        self.queue_size = queue_size
+        self.url_budget = url_budget
+        self.method = method
+        # Optional utils.fetch_strategy.FetchStrategy picking the method per URL in 'auto' mode
+        self.strategy = strategy
+        # Extraction workers are replaced after this many pages, so parser caches can't grow unbounded
+        self.extract_max_tasks = extract_max_tasks
+        # URLs taken from the scheduler whose result hasn't been handed to on_result yet
+        self._unfinished = 0
+
+    def run(self, scheduler, on_result):
+        """
+        Crawls every URL queued in scheduler (items are passed back as keys)
+        and calls on_result(key, lines, trace) from the calling thread for each
+        one, where trace is the URL's utils.crawl_metrics trace dict. on_result
+        may queue more URLs; the run ends once the scheduler is empty and every
+        taken URL has been handed back.
+        """
+        # forkserver: the extraction workers must not be forked from a process running an event loop and threads
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["utils.worker_preload"])
+        pool_options = {"max_tasks_per_child": self.extract_max_tasks} if self.extract_max_tasks else {}
+        process_pool = ProcessPoolExecutor(max_workers=self.extract_workers, mp_context=context, **pool_options)
+        render_pool = ThreadPoolExecutor(max_workers=max(1, self.render_workers))
+        try:
+            asyncio.run(self._run(scheduler, on_result, process_pool, render_pool))
+        finally:
+            render_pool.shutdown(wait=True)
+            process_pool.shutdown(wait=True)
+
+    async def _run(self, scheduler, on_result, process_pool, render_pool):
+        raw_pages = asyncio.Queue(maxsize=self.queue_size)
+        results = asyncio.Queue(maxsize=self.queue_size)
+        fetcher = AsyncFetcher(max_concurrency=self.fetch_concurrency, max_per_host=self.max_per_host,
+                               page_cache=self.processor.page_cache, cache_mode=self.processor.cache_mode,
+                               url_budget=self.url_budget)
+        # Set before the stage tasks are created so that they all share the collector
+        with collect_traces() as traces:
+            async with fetcher:
+                fetchers = [asyncio.create_task(self._fetch_stage(scheduler, fetcher, raw_pages))
+                            for _ in range(self.fetch_concurrency)]
+                # Keep every extraction process busy plus one queued job each
+                extractors = [asyncio.create_task(self._extract_stage(raw_pages, results, process_pool,
+                                                                      render_pool, traces))
+                              for _ in range(self.extract_workers * 2)]
+                writer = asyncio.create_task(self._write_stage(results, on_result, len(extractors)))
+
+                await asyncio.gather(*fetchers)
+                for _ in extractors:
+                    await raw_pages.put(_DONE)
+                await asyncio.gather(*extractors)
+                await writer
+
+    async def _fetch_stage(self, scheduler, fetcher, raw_pages):
+        while scheduler.pending() or self._unfinished:
+            entry = scheduler.next_ready()
+            if entry is None:
+                wait = scheduler.wait_time()
+                await asyncio.sleep(0.5 if wait is None else min(wait, 0.5))
+                continue
+            url, key = entry
+            self._unfinished += 1
+            method = self.method
+            if method == 'auto' and self.strategy is not None:
+                method = self.strategy.choose(url)
+            if method in ['selenium', 'skip'] or url.lower().endswith(DOC_EXTENSIONS):
+                page = None
+                ok = True  # nothing was requested from the domain yet
+            else:
+                page = await fetcher.fetch(url)
+                ok = page is not None
+            scheduler.done(url, ok=ok)
+            await raw_pages.put((key, url, page, method))
+
+    async def _extract_stage(self, raw_pages, results, process_pool, render_pool, traces):
+        loop = asyncio.get_running_loop()
+        while True:
+            entry = await raw_pages.get()
+            if entry is _DONE:
+                await results.put(_DONE)
+                return
+            key, url, page, method = entry
+            with trace_url(url) as trace:
+                try:
+                    if method == 'skip':
+                        fail("domain_skipped")
+                        lines = []
+                    elif isinstance(page, NotHtml):
+                        lines = []
+                        if page.route == "document":
+                            note(method="pdf")
+                            # The process pool already fills the CPUs, so one process per document
+                            with stage("doc"):
+                                lines = await loop.run_in_executor(
+                                    process_pool, functools.partial(document2lines, page.data, workers=1))
+                    elif url.lower().endswith(DOC_EXTENSIONS):
+                        note(method="pdf")
+                        with stage("doc"):
+                            lines = await loop.run_in_executor(process_pool, _extract_doc, url,
+                                                               self.url_budget)
+                    else:
+                        if page is None and method in ['auto', 'selenium']:
+                            page = await loop.run_in_executor(render_pool, _render, self.processor, url,
+                                                              self.url_budget, trace)
+                            if page is not None and self.processor.page_cache is not None:
+                                self.processor.page_cache.put(url, page, method="selenium")
+                        with stage("extract"):
+                            lines = await loop.run_in_executor(process_pool, html2lines, page)
+                except Exception as e:
+                    # A dead extraction process isn't the page's fault; the crawl log retries it
+                    fail("worker_lost" if isinstance(e, BrokenProcessPool) else "extraction_failed")
+                    print(f"Extraction failed for {url}: {e}", file=sys.stderr)
+                    lines = []
+            await results.put((key, lines, finish_trace(traces.pop(url, trace), url, lines)))
+
+    async def _write_stage(self, results, on_result, n_producers):
+        finished = 0
+        while finished < n_producers:
+            entry = await results.get()
+            if entry is _DONE:
+                finished += 1
+                continue
+            try:
+                on_result(*entry)
+            finally:
+                self._unfinished -= 1
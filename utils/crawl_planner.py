@@ -0,0 +1,122 @@
+import json
+import math
+import re
+from collections import Counter, deque
+
+from utils.url_utils import get_domain_name, normalize_url
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been before but by can could did do does for from had
+has have he her his how if in into is it its may more most not of on or our over she should so than
+that the their them there these they this those to under was were what when where which who why will
+with would you your
+""".split())
+
+
+def terms(text):
+    """Lowercased content words of text."""
+    return {t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS}
+
+
+def iter_claim_rows(search_results, claim):
+    """Yields every search result of a claim as a dict (query, page, rank, url, title, snippet)."""
+    if hasattr(search_results, "iter_rows"):
+        # Claims without results aren't in a SearchStore; like the dict walk, they have no rows
+        if claim in search_results:
+            yield from search_results.iter_rows(claim)
+        return
+    for query, page_results in search_results.get(claim, {}).items():
+        for page_num, results in page_results.items():
+            for i, result in enumerate(results):
+                yield {
+                    "query": query,
+                    "page": int(page_num),
+                    "rank": result.get("position", i + 1),
+                    "url": result["link"],
+                    "title": result.get("title") or "",
+                    "snippet": result.get("snippet") or "",
+                }
+
+
+class CrawlPlanner:
+    """
+    Crawls a claim's search results best first and stops once the claim has
+    budget good evidence documents (non-empty, at least min_words words and
+    not a near-duplicate of a page crawled before).
+
+    A result's score is a weighted sum (weights) of:
+      - its position: 1 / log2(1 + overall rank), pages being page_size long,
+      - how much of the claim and of the query that found it (the claim's
+        decomposition) its title and snippet cover,
+      - a prior for its domain from domain_scores (domain -> score in [0, 1],
+        e.g. credibility), default_domain_score for unknown domains.
+    A URL found by several queries keeps its best score.
+
+    Only budget - good + overfetch URLs of a claim are queued at a time, so the
+    crawl cost of a claim follows how much evidence it still needs.
+    """
+    def __init__(self, budget=8, overfetch=2, min_words=50, weights=(0.4, 0.4, 0.2),
+                 domain_scores=None, default_domain_score=0.5, page_size=10):
+        self.budget = budget
+        self.overfetch = overfetch
+        self.min_words = min_words
+        self.weights = weights
+        self.domain_scores = domain_scores or {}
+        self.default_domain_score = default_domain_score
+        self.page_size = page_size
+        self.queues = {}
+        self.good = Counter()
+
+    @staticmethod
+    def load_domain_scores(path):
+        with open(path) as f:
+            return {domain: float(score) for domain, score in json.load(f).items()}
+
+    def score(self, claim_terms, result):
+        position = (result["page"] - 1) * self.page_size + result["rank"]
+        rank_score = 1 / math.log2(1 + max(1, position))
+        wanted = claim_terms | terms(result["query"])
+        found = terms(result["title"] + " " + result["snippet"])
+        overlap = len(wanted & found) / len(wanted) if wanted else 0.0
+        domain_score = self.domain_scores.get(get_domain_name(result["url"]), self.default_domain_score)
+        w_rank, w_overlap, w_domain = self.weights
+        return w_rank * rank_score + w_overlap * overlap + w_domain * domain_score
+
+    def rank(self, search_results, claim):
+        """{normalized url: best score} over every search result of a claim."""
+        claim_terms = terms(claim)
+        scores = {}
+        for result in iter_claim_rows(search_results, claim):
+            norm_url = normalize_url(result["url"])
+            score = self.score(claim_terms, result)
+            if score > scores.get(norm_url, -1.0):
+                scores[norm_url] = score
+        return scores
+
+    def add_claim(self, claim_id, search_results, claim, norm_urls):
+        """Queues the normalized URLs of a claim best first."""
+        scores = self.rank(search_results, claim)
+        ordered = sorted(set(norm_urls), key=lambda norm_url: -scores.get(norm_url, 0.0))
+        self.queues[claim_id] = deque(ordered)
+
+    def next_urls(self, claim_id, in_flight):
+        """Next URLs of a claim to crawl, given in_flight of its URLs queued or being crawled."""
+        queue = self.queues.get(claim_id)
+        if not queue or self.satisfied(claim_id):
+            return []
+        wanted = self.budget - self.good[claim_id] + self.overfetch - in_flight
+        return [queue.popleft() for _ in range(min(wanted, len(queue)))]
+
+    def is_good(self, lines, duplicate=False):
+        return not duplicate and sum(len(line.split()) for line in lines) >= self.min_words
+
+    def credit(self, claim_id, lines, duplicate=False):
+        """Counts a crawled URL of a claim. Returns True once the claim has just met its budget."""
+        if self.satisfied(claim_id) or not self.is_good(lines, duplicate):
+            return False
+        self.good[claim_id] += 1
+        return self.satisfied(claim_id)
+
+    def satisfied(self, claim_id):
+        return self.good[claim_id] >= self.budget
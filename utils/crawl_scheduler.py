@@ -0,0 +1,155 @@
+import heapq
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+
+def hostname(url):
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class DomainState:
+    def __init__(self, delay):
+        self.queue = deque()
+        self.in_flight = 0
+        self.next_allowed = 0.0
+        self.delay = delay
+        self.consecutive_failures = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.scheduled = False
+
+
+class CrawlScheduler:
+    """
+    Hands out pending URLs so that no domain is hit faster than min_delay
+    seconds apart or by more than max_per_domain concurrent requests, while
+    interleaving across domains so there is always allowed work when possible.
+
+    Domains that keep failing back off exponentially (min_delay * backoff_factor
+    ** consecutive failures, capped at max_backoff) and recover on the next
+    success. Not thread-safe: drive it from one dispatcher loop.
+    """
+    def __init__(self, min_delay=1.0, max_per_domain=2, backoff_factor=2.0, max_backoff=120.0,
+                 domain_of=hostname):
+        self.min_delay = min_delay
+        self.max_per_domain = max_per_domain
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.domain_of = domain_of
+        self.domains = {}
+        self._heap = []
+        self._seq = 0
+        self._pending = 0
+        self._in_flight = 0
+
+    def add(self, url, item=None):
+        domain = self.domain_of(url)
+        state = self.domains.get(domain)
+        if state is None:
+            state = self.domains[domain] = DomainState(self.min_delay)
+        state.queue.append((url, item))
+        self._pending += 1
+        self._schedule(domain, state)
+
+    def _schedule(self, domain, state):
+        if state.scheduled or not state.queue or state.in_flight >= self.max_per_domain:
+            return
+        state.scheduled = True
+        self._seq += 1
+        heapq.heappush(self._heap, (state.next_allowed, self._seq, domain))
+
+    def pending(self):
+        return self._pending
+
+    def in_flight(self):
+        return self._in_flight
+
+    def next_ready(self, now=None):
+        """Returns (url, item) of a URL that may be crawled now, or None."""
+        now = time.monotonic() if now is None else now
+        while True:
+            if not self._heap or self._heap[0][0] > now:
+                return None
+            _, _, domain = heapq.heappop(self._heap)
+            state = self.domains[domain]
+            state.scheduled = False
+            if state.next_allowed > now:
+                # A failure reported after the domain was scheduled pushed it back
+                self._schedule(domain, state)
+                continue
+            if state.queue:
+                break  # else every URL of the domain was discarded after it got scheduled
+        url, item = state.queue.popleft()
+        state.in_flight += 1
+        state.next_allowed = now + state.delay
+        self._pending -= 1
+        self._in_flight += 1
+        self._schedule(domain, state)
+        return url, item
+
+    def next_batch(self, n, now=None):
+        batch = []
+        while len(batch) < n:
+            entry = self.next_ready(now)
+            if entry is None:
+                break
+            batch.append(entry)
+        return batch
+
+    def wait_time(self, now=None):
+        """Seconds until the next domain becomes ready (None if no domain has allowed work)."""
+        if not self._heap:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, self._heap[0][0] - now)
+
+    def discard(self, url, item=None):
+        """Drops a queued URL that is no longer needed. Returns False if it isn't queued (any more)."""
+        state = self.domains.get(self.domain_of(url))
+        if state is None:
+            return False
+        try:
+            state.queue.remove((url, item))
+        except ValueError:
+            return False
+        self._pending -= 1
+        return True
+
+    def done(self, url, ok=True):
+        """Reports the outcome of a URL previously returned by next_ready."""
+        domain = self.domain_of(url)
+        state = self.domains[domain]
+        state.in_flight -= 1
+        self._in_flight -= 1
+        if ok:
+            state.succeeded += 1
+            state.consecutive_failures = 0
+            state.delay = self.min_delay
+        else:
+            state.failed += 1
+            state.consecutive_failures += 1
+            state.delay = min(self.max_backoff,
+                              self.min_delay * self.backoff_factor ** state.consecutive_failures)
+            state.next_allowed = max(state.next_allowed, time.monotonic() + state.delay)
+        self._schedule(domain, state)
+
+    def backing_off(self):
+        return [d for d, s in self.domains.items() if s.delay > self.min_delay]
+
+    def backoff_report(self):
+        """Per-domain queue and backoff state, e.g. for dumping to JSON."""
+        now = time.monotonic()
+        return {
+            domain: {
+                "queued": len(state.queue),
+                "in_flight": state.in_flight,
+                "succeeded": state.succeeded,
+                "failed": state.failed,
+                "consecutive_failures": state.consecutive_failures,
+                "delay": state.delay,
+                "ready_in": max(0.0, state.next_allowed - now),
+            }
+            for domain, state in self.domains.items()
+        }
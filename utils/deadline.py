@@ -0,0 +1,71 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """
+    A time budget that is checked cooperatively instead of interrupting the caller.
+
+    Unlike signal.alarm, it works in any thread and inside event loops, and it
+    never fires in the middle of trafilatura or Selenium internals: each stage
+    asks for its remaining budget (clamp) or checks it between steps (check).
+    A nested deadline never outlives the one it is created under.
+    """
+    def __init__(self, seconds, parent=None):
+        self.expires_at = time.monotonic() + seconds
+        if parent is not None:
+            self.expires_at = min(self.expires_at, parent.expires_at)
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage=""):
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline exceeded{' during ' + stage if stage else ''}")
+
+    def clamp(self, timeout):
+        """Returns timeout shortened to the remaining budget."""
+        return min(timeout, self.remaining())
+
+
+# Context variables are per thread and are copied into every asyncio task,
+# so each thread or task sees the deadline of the code that started it.
+_current_deadline = contextvars.ContextVar("crawl_deadline", default=None)
+
+
+def current_deadline():
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline(seconds):
+    """Runs the enclosed block under a time budget of seconds (None means unbounded)."""
+    if seconds is None:
+        yield current_deadline()
+        return
+    scope = Deadline(seconds, parent=current_deadline())
+    token = _current_deadline.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_deadline.reset(token)
+
+
+def budget(timeout):
+    """Clamps timeout to the current deadline, if there is one."""
+    scope = current_deadline()
+    return timeout if scope is None else scope.clamp(timeout)
+
+
+def check_deadline(stage=""):
+    scope = current_deadline()
+    if scope is not None:
+        scope.check(stage)
@@ -0,0 +1,93 @@
+import json
+import os
+import random
+import sys
+import time
+
+# Trace methods that mean the page came over plain HTTP rather than from a browser
+HTTP_METHODS = ("trafilatura", "http", "cache")
+
+
+class FetchStrategy:
+    """
+    Learns per domain which fetch method yields non-empty text and picks the
+    method for the next URL of that domain:
+
+        'auto'      no clear winner yet: HTTP fetch first, Selenium as fallback
+        'selenium'  HTTP keeps failing but rendering has not: skip the HTTP retries
+        'skip'      every method keeps failing: fail fast instead of spending the budget
+
+    A probe_rate share of URLs is crawled with 'auto' anyway so that domains
+    that changed (or recovered) are noticed. Stats persist in path as JSON.
+    """
+    def __init__(self, path="data/fetch_strategy.json", domain_of=None, min_samples=3,
+                 http_min_rate=0.2, dead_after=5, probe_rate=0.1):
+        self.path = path
+        self.domain_of = domain_of
+        self.min_samples = min_samples
+        self.http_min_rate = http_min_rate
+        self.dead_after = dead_after
+        self.probe_rate = probe_rate
+        self.domains = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except ValueError:
+            print(f"Ignoring corrupt fetch strategy file {self.path}", file=sys.stderr)
+            return {}
+
+    def _stats(self, domain):
+        stats = self.domains.get(domain)
+        if stats is None:
+            stats = self.domains[domain] = {
+                "http": [0, 0],  # [attempts, successes]
+                "selenium": [0, 0],
+                "consecutive_failures": 0,
+                "updated": 0.0,
+            }
+        return stats
+
+    def choose(self, url):
+        """Returns 'auto', 'selenium' or 'skip' for url."""
+        stats = self.domains.get(self.domain_of(url))
+        if stats is None or random.random() < self.probe_rate:
+            return "auto"
+        if stats["consecutive_failures"] >= self.dead_after:
+            return "skip"
+        http_attempts, http_ok = stats["http"]
+        selenium_attempts, selenium_ok = stats["selenium"]
+        if http_attempts < self.min_samples or http_ok / http_attempts >= self.http_min_rate:
+            return "auto"
+        # Keep sending the domain to Selenium until it has proven no better than HTTP
+        if selenium_attempts < self.min_samples or selenium_ok / selenium_attempts > http_ok / http_attempts:
+            return "selenium"
+        return "auto"
+
+    def observe(self, trace):
+        """Updates the domain's stats from a utils.crawl_metrics trace dict."""
+        if trace["method"] == "pdf" or trace["failure"] in ("domain_skipped", "no_browser"):
+            return
+        ok = trace["lines"] > 0
+        stages = trace["stages"]
+        stats = self._stats(self.domain_of(trace["url"]))
+        if trace["method"] in HTTP_METHODS or "fetch" in stages or "cache" in stages:
+            stats["http"][0] += 1
+            stats["http"][1] += ok and trace["method"] in HTTP_METHODS
+        if trace["method"] == "selenium" or "page_load" in stages:
+            stats["selenium"][0] += 1
+            stats["selenium"][1] += ok and trace["method"] == "selenium"
+        stats["consecutive_failures"] = 0 if ok else stats["consecutive_failures"] + 1
+        stats["updated"] = time.time()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.domains, f)
+        os.replace(tmp_path, self.path)
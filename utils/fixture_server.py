@@ -0,0 +1,324 @@
+"""
+Local HTTP server for a synthetic, deterministic crawl corpus, so crawler
+changes can be measured offline (see benchmark_crawler.py).
+
+Every URL is /{kind}/{i}; page i of a kind always has the same content:
+    article   plain news-style article
+    cookie    article under a fixed-position cookie consent banner
+    js        empty shell whose text is only written by JavaScript
+    doc       PDF served without a file extension (odd i as application/octet-stream)
+    redirect  chain of redirect_hops 302s ending at /article/{i}
+    slow      article sent after slow_seconds
+    timeout   article sent after hang_seconds (past any sane crawl budget)
+    huge      article padded to huge_mb (odd i chunked, without Content-Length)
+    missing   404
+
+Run standalone with: python -m utils.fixture_server --port 8765
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import threading
+from functools import lru_cache
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Share of each kind of URL in a generated corpus
+DEFAULT_MIX = {
+    "article": 50,
+    "cookie": 10,
+    "js": 5,
+    "doc": 8,
+    "redirect": 10,
+    "slow": 10,
+    "timeout": 2,
+    "huge": 2,
+    "missing": 3,
+}
+
+_SYLLABLES = ("ka", "ro", "mi", "tan", "vel", "so", "ri", "den", "lo", "pa", "mar", "ne", "sti", "cor",
+              "um", "bel", "fa", "gra", "ti", "on", "va", "lis", "pre", "dor", "qui", "an", "te", "sul")
+_VOCABULARY = None
+
+
+def vocabulary():
+    global _VOCABULARY
+    if _VOCABULARY is None:
+        rng = random.Random(0)
+        words = ["the", "of", "and", "to", "in", "a", "is", "that", "for", "was", "said", "on", "with"]
+        while len(words) < 2000:
+            words.append("".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(1, 4))))
+        _VOCABULARY = words
+    return _VOCABULARY
+
+
+@lru_cache(maxsize=4096)
+def article(i):
+    """(title, paragraphs) of synthetic article i."""
+    rng = random.Random(i)
+    words = vocabulary()
+    title = " ".join(rng.choice(words) for _ in range(rng.randint(5, 10))).capitalize()
+    paragraphs = []
+    for _ in range(rng.randint(6, 24)):
+        sentences = []
+        for _ in range(rng.randint(2, 6)):
+            sentence = " ".join(rng.choice(words) for _ in range(rng.randint(8, 25)))
+            sentences.append(sentence.capitalize() + ".")
+        paragraphs.append(" ".join(sentences))
+    return title, paragraphs
+
+
+def article_html(i, banner="", pad_bytes=0):
+    title, paragraphs = article(i)
+    body = "".join(f"<p>{escape(paragraph)}</p>\n" for paragraph in paragraphs)
+    padding = ""
+    if pad_bytes:
+        filler = f"<p class=\"archive\">{escape(paragraphs[0])}</p>\n"
+        padding = filler * (pad_bytes // len(filler) + 1)
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{escape(title)}</title></head><body>\n"
+            f"<header><nav><a href=\"/\">Home</a> <a href=\"/news\">News</a> <a href=\"/about\">About</a></nav></header>\n"
+            f"{banner}<article><h1>{escape(title)}</h1>\n{body}</article>\n{padding}"
+            f"<footer><p>Copyright Fixture News</p></footer></body></html>")
+
+
+COOKIE_BANNER = (
+    "<div id=\"cookie-banner\" class=\"cookie-consent\" style=\"position:fixed;bottom:0;left:0;right:0;"
+    "z-index:9999;background:#fff\"><p>We use cookies to improve your experience and for analytics.</p>"
+    "<button id=\"reject-cookies\">Reject</button><button id=\"accept-cookies\">Accept all</button></div>\n")
+
+
+def js_html(i):
+    title, paragraphs = article(i)
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{escape(title)}</title></head><body>"
+            f"<div id=\"root\"></div><script>\nconst article = {json.dumps({'title': title, 'paragraphs': paragraphs})};\n"
+            "document.getElementById('root').innerHTML = '<article><h1>' + article.title + '</h1>' +\n"
+            "    article.paragraphs.map(p => '<p>' + p + '</p>').join('') + '</article>';\n"
+            "</script></body></html>")
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(paragraphs, line_chars=90, lines_per_page=50):
+    """Minimal valid PDF (Helvetica text, no dependencies) of paragraphs wrapped at line_chars."""
+    lines = []
+    for paragraph in paragraphs:
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > line_chars:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines += [line, ""]
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)]
+
+    objects = [None, None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_lines in pages:
+        text = " ".join(f"({_pdf_escape(line)}) '" for line in page_lines)
+        stream = f"BT /F1 11 Tf 14 TL 50 800 Td {text} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        kids.append(b"%d 0 R" % len(objects))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def corpus_urls(base_url, n, mix=None, seed=0):
+    """n (kind, url) pairs drawn from mix ({kind: weight}), each URL a distinct page."""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=n)
+    return [(kind, f"{base_url}/{kind}/{i}") for i, kind in enumerate(kinds)]
+
+
+def parse_mix(text):
+    """'article=50,slow=10' -> {'article': 50.0, 'slow': 10.0}"""
+    mix = {}
+    for item in text.split(","):
+        kind, weight = item.split("=")
+        if kind.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Unknown page kind {kind!r}, expected one of {sorted(DEFAULT_MIX)}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        # Covers both writes in do_GET and the request-line read of a kept-alive connection
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the crawler gave up on the page (timeouts, size caps) or dropped the connection
+
+    def do_GET(self):
+        server = self.server.fixture
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        try:
+            kind, i = parts[0], int(parts[1])
+        except (IndexError, ValueError):
+            return self._send(404, b"Not found", "text/plain")
+        if kind == "article":
+            self._send(200, article_html(i).encode(), "text/html; charset=utf-8")
+        elif kind == "cookie":
+            self._send(200, article_html(i, banner=COOKIE_BANNER).encode(), "text/html; charset=utf-8")
+        elif kind == "js":
+            self._send(200, js_html(i).encode(), "text/html; charset=utf-8")
+        elif kind == "doc":
+            content_type = "application/pdf" if i % 2 == 0 else "application/octet-stream"
+            self._send(200, server.pdf(i), content_type)
+        elif kind == "redirect":
+            hops = int(parts[2]) if len(parts) > 2 else server.redirect_hops
+            location = f"/redirect/{i}/{hops - 1}" if hops > 1 else f"/article/{i}"
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif kind in ("slow", "timeout"):
+            delay = server.slow_seconds if kind == "slow" else server.hang_seconds
+            if server.stopping.wait(delay):
+                return
+            self._send(200, article_html(i).encode(), "text/html; charset=utf-8")
+        elif kind == "huge":
+            body = server.huge(i)
+            if i % 2 == 0:
+                self._send(200, body, "text/html; charset=utf-8")
+            else:
+                self._send_chunked(body, "text/html; charset=utf-8")
+        else:
+            self._send(404, b"Not found", "text/plain")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, body, content_type, chunk_size=1 << 16):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class FixtureServer:
+    """
+    Serves the synthetic corpus from a background thread; usable as a context
+    manager. port=0 picks a free port (see base_url).
+    """
+    def __init__(self, host="127.0.0.1", port=0, slow_seconds=2.0, hang_seconds=120.0, huge_mb=12,
+                 redirect_hops=3):
+        self.slow_seconds = slow_seconds
+        self.hang_seconds = hang_seconds
+        self.huge_bytes = int(huge_mb * 1024**2)
+        self.redirect_hops = redirect_hops
+        self.stopping = threading.Event()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.fixture = self
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    @lru_cache(maxsize=256)
+    def pdf(self, i):
+        title, paragraphs = article(i)
+        return make_pdf([title] + paragraphs)
+
+    @lru_cache(maxsize=4)
+    def huge(self, i):
+        return article_html(i, pad_bytes=self.huge_bytes).encode()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _serve(conn, options):
+    server = FixtureServer(**options).start()
+    conn.send(server.base_url)
+    conn.recv()  # blocks until the parent asks to stop (or dies)
+    server.stop()
+
+
+def start_server_process(**options):
+    """
+    Runs a FixtureServer in its own process, so its CPU and memory stay out of
+    what a benchmark measures. Returns (process, base_url, stop), stop() ending it.
+    """
+    context = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=_serve, args=(child_conn, options), daemon=True)
+    process.start()
+    base_url = parent_conn.recv()
+
+    def stop():
+        try:
+            parent_conn.send(None)
+        except OSError:
+            pass
+        process.join(10)
+        if process.is_alive():
+            process.terminate()
+    return process, base_url, stop
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the synthetic crawl corpus")
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--slow_seconds', type=float, default=2.0)
+    parser.add_argument('--hang_seconds', type=float, default=120.0)
+    parser.add_argument('--huge_mb', type=float, default=12)
+    parser.add_argument('--list', type=int, default=0, help='Print this many corpus URLs and exit')
+    args = parser.parse_args()
+    if args.list:
+        for kind, url in corpus_urls(f"http://{args.host}:{args.port}", args.list):
+            print(kind, url)
+        sys.exit(0)
+    server = FixtureServer(args.host, args.port, slow_seconds=args.slow_seconds,
+                           hang_seconds=args.hang_seconds, huge_mb=args.huge_mb)
+    print(f"Serving the fixture corpus at {server.base_url}", file=sys.stderr)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,200 @@
+import asyncio
+import importlib.util
+import sys
+from urllib.parse import urlsplit
+
+import aiohttp
+from trafilatura.settings import DEFAULT_CONFIG
+from trafilatura.utils import decode_file
+from utils.deadline import deadline, budget, check_deadline, DeadlineExceeded
+from utils.crawl_metrics import trace_url, stage, note, fail
+from utils.content_router import NotHtml, SNIFF_BYTES, MAX_BYTES, route_response, declared_size
+
+# Encodings both requests (urllib3) and aiohttp decode; brotli only with a decoder installed
+ACCEPT_ENCODING = "gzip, deflate"
+if importlib.util.find_spec("brotli") or importlib.util.find_spec("brotlicffi"):
+    ACCEPT_ENCODING += ", br"
+
+DEFAULT_HEADERS = {
+    "User-Agent": 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+                  'AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/131.0.0.0 Safari/537.36',
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+# TLS certificate verification, shared by the requests (sync) and aiohttp (async) fetch paths
+VERIFY_TLS = True
+
+
+async def read_body(response, n):
+    """Reads up to n bytes of an aiohttp response (StreamReader.read returns whatever is buffered)."""
+    chunks = []
+    size = 0
+    while size < n:
+        chunk = await response.content.read(n - size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks)
+
+
+class AsyncFetcher:
+    """
+    Fetches many pages concurrently over pooled keep-alive connections.
+
+    Concurrency is capped globally (max_concurrency) and per host (max_per_host).
+    Pages are decoded the same way trafilatura.fetch_url decodes them, so the
+    result can be passed straight to WebpageProcessor.html2lines. Responses that
+    are not HTML are routed from their Content-Type and first bytes: fetch returns
+    a utils.content_router.NotHtml for them instead of a page, so documents are
+    extracted with pymupdf and unusable binaries are dropped mid-download.
+    Bodies are read in chunks up to the byte limit of their route (MAX_BYTES,
+    counted after decompression); oversized responses are abandoned, not retried.
+    With a page_cache, responses are stored and cached pages are revalidated
+    (cache_mode='revalidate') or served without a request (cache_mode='prefer').
+    url_budget caps the total time spent on one URL, retries included.
+    """
+    def __init__(self, max_concurrency=64, max_per_host=4, timeout=30, retries=3, retry_delay=3,
+                 page_cache=None, cache_mode='revalidate', url_budget=None):
+        self.max_concurrency = max_concurrency
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.page_cache = page_cache
+        self.cache_mode = cache_mode
+        self.url_budget = url_budget
+        self.session = None
+        self._global_slots = None
+        self._host_slots = {}
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        if self.session is not None:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.max_per_host,
+            keepalive_timeout=30,
+            ttl_dns_cache=300,
+            ssl=VERIFY_TLS,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=DEFAULT_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._global_slots = asyncio.Semaphore(self.max_concurrency)
+        self._host_slots = {}
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _host_slot(self, url):
+        host = urlsplit(url).hostname or ""
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self._host_slots[host]
+
+    async def _fetch_once(self, url, cached=None):
+        min_size = DEFAULT_CONFIG.getint('DEFAULT', 'MIN_FILE_SIZE')
+        headers = {}
+        if cached is not None:
+            headers = self.page_cache.conditional_headers(cached[1])
+        request_timeout = aiohttp.ClientTimeout(total=budget(self.timeout))
+        async with self.session.get(url, headers=headers, allow_redirects=True,
+                                    timeout=request_timeout) as response:
+            if response.status == 304 and cached is not None:
+                print("Not modified " + url, file=sys.stderr)
+                self.page_cache.touch(url)
+                note(method="cache", bytes=len(cached[0]))
+                return decode_file(cached[0])
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(
+                    response.request_info, response.history,
+                    status=response.status, message=response.reason or "")
+            content_type = response.headers.get("Content-Type")
+            head = await read_body(response, SNIFF_BYTES)
+            route = route_response(url, content_type, head)
+            if route == "skip":
+                return NotHtml(url, route, content_type)
+            max_size = MAX_BYTES[route]
+            if declared_size(response.headers) > max_size:
+                return NotHtml(url, "skip", content_type, reason="too_large")
+            body = head + await read_body(response, max_size + 1 - len(head))
+            response_headers = dict(response.headers)
+        if len(body) > max_size:
+            return NotHtml(url, "skip", content_type, reason="too_large")
+        if len(body) < min_size:
+            raise ValueError(f"Unexpected body size {len(body)}")
+        if route == "document":
+            return NotHtml(url, route, content_type, body)
+        if self.page_cache is not None:
+            self.page_cache.put(url, body, response_headers)
+        note(method="http", bytes=len(body))
+        return decode_file(body)
+
+    async def fetch(self, url):
+        """Returns the decoded page for url, a NotHtml for non-HTML content, or None once all retries failed."""
+        with trace_url(url):
+            page = await self._fetch(url)
+            if page is None:
+                fail("fetch_failed")
+            elif isinstance(page, NotHtml) and page.route == "skip":
+                fail(page.reason)
+            return page
+
+    async def _fetch(self, url):
+        cached = None
+        if self.page_cache is not None:
+            cached = self.page_cache.get(url)
+            if cached is not None and self.cache_mode == 'prefer':
+                print("Cache hit " + url, file=sys.stderr)
+                note(method="cache", bytes=len(cached[0]))
+                return decode_file(cached[0])
+
+        async with self._global_slots, self._host_slot(url):
+            # Each fetch runs in its own task, so this deadline only covers this URL
+            with deadline(self.url_budget):
+                for i in range(self.retries):
+                    try:
+                        check_deadline("fetch")
+                        with stage("fetch"):
+                            page = await self._fetch_once(url, cached)
+                        print("Fetched " + url, file=sys.stderr)
+                        return page
+                    except DeadlineExceeded as e:
+                        fail("deadline")
+                        print(f"{e}: {url}", file=sys.stderr)
+                        return None
+                    except Exception as e:
+                        print(f"Async fetch failed for {url}: {i+1}/{self.retries} ({e})", file=sys.stderr)
+                        if i + 1 < self.retries:
+                            with stage("retry_sleep"):
+                                await asyncio.sleep(budget(self.retry_delay))
+        return None
+
+    async def fetch_many(self, urls):
+        """Returns a dict mapping every url in urls to what fetch returned for it."""
+        urls = list(dict.fromkeys(urls))
+        pages = await asyncio.gather(*(self.fetch(url) for url in urls))
+        return dict(zip(urls, pages))
+
+
+def fetch_pages(urls, **fetcher_kwargs):
+    """Synchronous entry point: fetches all urls concurrently and returns {url: page}."""
+    async def _run():
+        async with AsyncFetcher(**fetcher_kwargs) as fetcher:
+            return await fetcher.fetch_many(urls)
+    return asyncio.run(_run())
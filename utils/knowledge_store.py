@@ -0,0 +1,205 @@
+import glob
+import json
+import os
+import socket
+import sys
+import time
+import zlib
+
+from utils.crawl_log import content_hash
+
+
+class KnowledgeStore:
+    """
+    Packed knowledge store: zlib-compressed records appended to shard files
+    (<time>-<host>-<pid>-<n>.kss) under store_dir, with a sidecar index per shard
+    (<shard>.idx, one tab-separated line per record):
+
+        P <page hash> <offset> <length>    text of a page (its lines joined by newlines)
+        C <claim id>  <offset> <length>    a claim's evidence entries, without their text
+        U <url>       <page hash>          latest page stored for a URL
+
+    Page texts are stored once however many claims cite them (keyed by a hash
+    of the text), and every record can be read on its own by offset, so one
+    page or one claim is loaded without parsing anything else. Like the crawl
+    log, each writer gets its own shard and index lines are written after their
+    record, so an index never points at a partial record. Later records win.
+    """
+    def __init__(self, store_dir="data/knowledge_store", max_shard_bytes=256 * 1024**2, compresslevel=6):
+        self.store_dir = store_dir
+        self.max_shard_bytes = max_shard_bytes
+        self.compresslevel = compresslevel
+        os.makedirs(store_dir, exist_ok=True)
+        self.pages = {}
+        self.claims = {}
+        self.urls = {}
+        self._load_index()
+        self._data = None
+        self._idx = None
+        self._shards = 0
+        self._readers = {}
+
+    @staticmethod
+    def _shard_order(idx_path):
+        # Shard names start with their creation time and end with the writer's shard count
+        name = os.path.basename(idx_path)[:-len(".kss.idx")]
+        return int(name.split("-")[0]), int(name.rsplit("-", 1)[1])
+
+    def _load_index(self):
+        tables = {"P": self.pages, "C": self.claims}
+        for idx_path in sorted(glob.glob(os.path.join(self.store_dir, "*.kss.idx")), key=self._shard_order):
+            data_path = idx_path[:-len(".idx")]
+            with open(idx_path) as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break  # torn write at the end of the index
+                    fields = line.rstrip("\n").split("\t")
+                    if fields[0] == "U" and len(fields) == 3:
+                        self.urls[fields[1]] = fields[2]
+                    elif fields[0] in tables and len(fields) == 4:
+                        tables[fields[0]][fields[1]] = (data_path, int(fields[2]), int(fields[3]))
+
+    def __contains__(self, claim_id):
+        return str(claim_id) in self.claims
+
+    def __len__(self):
+        return len(self.claims)
+
+    def claim_ids(self):
+        return list(self.claims)
+
+    def _open_shard(self):
+        name = f"{int(time.time())}-{socket.gethostname()}-{os.getpid()}-{self._shards}.kss"
+        self._shards += 1
+        self._data_path = os.path.join(self.store_dir, name)
+        self._data = open(self._data_path, "ab")
+        self._idx = open(self._data_path + ".idx", "a")
+
+    def _append(self, payload, index_line):
+        if self._data is not None and self._data.tell() >= self.max_shard_bytes:
+            self._close_writer()
+        if self._data is None:
+            self._open_shard()
+        data = zlib.compress(payload, self.compresslevel)
+        offset = self._data.tell()
+        self._data.write(data)
+        self._data.flush()
+        self._idx.write(index_line.format(offset=offset, length=len(data)))
+        self._idx.flush()
+        return self._data_path, offset, len(data)
+
+    @staticmethod
+    def page_hash(lines):
+        return content_hash(lines)
+
+    def write_page(self, url, lines):
+        """Stores the text of url (once per distinct text) and returns its page hash."""
+        page_hash = self.page_hash(lines)
+        if page_hash not in self.pages:
+            self.pages[page_hash] = self._append("\n".join(lines).encode("utf-8"),
+                                                 f"P\t{page_hash}\t{{offset}}\t{{length}}\n")
+        if self.urls.get(url) != page_hash:
+            if self._idx is None:
+                self._open_shard()
+            self._idx.write(f"U\t{url}\t{page_hash}\n")
+            self._idx.flush()
+            self.urls[url] = page_hash
+        return page_hash
+
+    def write_claim(self, claim_id, entries):
+        """Stores a claim's evidence entries (dicts in the claim-file layout, with their text)."""
+        records = []
+        for entry in entries:
+            record = {key: value for key, value in entry.items() if key != "text"}
+            record["page"] = self.write_page(entry["url"], entry["text"]) if entry["text"] else None
+            records.append(record)
+        payload = json.dumps(records, ensure_ascii=False).encode("utf-8")
+        self.claims[str(claim_id)] = self._append(payload, f"C\t{claim_id}\t{{offset}}\t{{length}}\n")
+
+    def _read(self, location):
+        data_path, offset, length = location
+        reader = self._readers.get(data_path)
+        if reader is None:
+            if self._data is not None and data_path == self._data_path:
+                self._data.flush()
+            reader = self._readers[data_path] = open(data_path, "rb")
+        reader.seek(offset)
+        return zlib.decompress(reader.read(length))
+
+    def read_page(self, url_or_hash):
+        """Lines of a stored page, by URL or page hash (None if unknown)."""
+        page_hash = self.urls.get(url_or_hash, url_or_hash)
+        location = self.pages.get(page_hash)
+        if location is None:
+            return None
+        return self._read(location).decode("utf-8").split("\n")
+
+    def read_claim(self, claim_id, with_text=True):
+        """A claim's entries in the claim-file layout (None if unknown)."""
+        location = self.claims.get(str(claim_id))
+        if location is None:
+            return None
+        try:
+            records = json.loads(self._read(location))
+        except (ValueError, zlib.error):
+            print(f"Corrupt knowledge store record for claim {claim_id}", file=sys.stderr)
+            return None
+        entries = []
+        for record in records:
+            page_hash = record.pop("page")
+            if with_text:
+                record["text"] = (self.read_page(page_hash) or []) if page_hash else []
+            entries.append(record)
+        return entries
+
+    def iter_claims(self, with_text=True):
+        """Streams (claim_id, entries) in shard order, so reads stay sequential."""
+        for claim_id, _ in sorted(self.claims.items(), key=lambda item: item[1][:2]):
+            entries = self.read_claim(claim_id, with_text)
+            if entries is not None:
+                yield claim_id, entries
+
+    def _close_writer(self):
+        for handle in (self._data, self._idx):
+            if handle is not None:
+                handle.close()
+        self._data = self._idx = None
+
+    def close(self):
+        self._close_writer()
+        for reader in self._readers.values():
+            reader.close()
+        self._readers = {}
+
+
+def migrate_json_store(json_dir="data/knowledge_store", store_dir="data/knowledge_store", remove=False):
+    """Packs every {claim_id}.json claim file of json_dir into a KnowledgeStore (optionally deleting the files)."""
+    store = KnowledgeStore(store_dir)
+    json_bytes = 0
+    migrated = 0
+    for path in sorted(glob.glob(os.path.join(json_dir, "*.json"))):
+        claim_id = os.path.basename(path)[:-len(".json")]
+        if claim_id in store:
+            continue
+        with open(path) as f:
+            entries = json.load(f)
+        store.write_claim(entries[0]["claim_id"] if entries else claim_id, entries)
+        json_bytes += os.path.getsize(path)
+        migrated += 1
+        if remove:
+            os.remove(path)
+    store.close()
+    packed_bytes = sum(os.path.getsize(p) for p in glob.glob(os.path.join(store_dir, "*.kss*")))
+    print(f"Migrated {migrated} claims: {json_bytes / 1024**2:.1f} MB of JSON, "
+          f"store is {packed_bytes / 1024**2:.1f} MB", file=sys.stderr)
+    return store
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Pack {claim_id}.json claim files into a KnowledgeStore")
+    parser.add_argument('--json_dir', type=str, default='data/knowledge_store')
+    parser.add_argument('--store_dir', type=str, default='data/knowledge_store')
+    parser.add_argument('--remove', action='store_true', help='Delete claim files once they are packed')
+    args = parser.parse_args()
+    migrate_json_store(args.json_dir, args.store_dir, args.remove)
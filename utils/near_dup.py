@@ -0,0 +1,141 @@
+import glob
+import os
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(lines, size=5):
+    """Hashes of the word size-grams of the text (lowercased, punctuation dropped)."""
+    tokens = _TOKEN.findall(" ".join(lines).lower())
+    if len(tokens) < size:
+        return np.zeros(0, dtype=np.uint64)
+    grams = {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of extracted texts with a banded LSH index, used to find
+    pages that are (near) copies of one seen before, e.g. syndicated wire
+    stories or mirrored press releases under different URLs.
+
+    With bands of rows_per_band = num_perm / bands rows, texts whose shingle
+    Jaccard similarity is around (1 / bands) ** (1 / rows_per_band) or more
+    become candidates; candidates are kept only if their estimated similarity
+    reaches threshold. Texts shorter than min_shingles shingles are not indexed.
+
+    Signatures can be saved to .npz files and loaded back by an index with the
+    same parameters, so pages indexed by earlier runs are matched too.
+    """
+    def __init__(self, num_perm=128, bands=16, threshold=0.8, shingle_size=5, min_shingles=20, seed=1):
+        assert num_perm % bands == 0
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.signatures = {}
+        self._buckets = [defaultdict(list) for _ in range(bands)]
+
+    def signature(self, lines):
+        """MinHash signature of the text, or None if it is too short to compare."""
+        hashes = shingles(lines, self.shingle_size)
+        if len(hashes) < self.min_shingles:
+            return None
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        # Universal hashing (a * x + b) mod p, one row per permutation; uint64 overflow wraps like
+        # datasketch. Chunked so that long documents don't materialise num_perm x n_shingles at once.
+        for start in range(0, len(hashes), 4096):
+            chunk = hashes[start:start + 4096]
+            permuted = (np.outer(self._a, chunk) + self._b[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+            np.minimum(signature, permuted.min(axis=1), out=signature)
+        return signature
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows_per_band:(band + 1) * self.rows_per_band].tobytes()
+
+    def query(self, signature, exclude=None):
+        """Key of the most similar indexed text (other than exclude) at or above threshold, or None."""
+        candidates = set()
+        for band, key in self._band_keys(signature):
+            candidates.update(self._buckets[band].get(key, ()))
+        candidates.discard(exclude)
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def _insert(self, key, signature):
+        self._remove(key)
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band][band_key].append(key)
+
+    def _remove(self, key):
+        signature = self.signatures.pop(key, None)
+        if signature is not None:
+            for band, band_key in self._band_keys(signature):
+                self._buckets[band][band_key].remove(key)
+
+    def add(self, key, lines):
+        """
+        Indexes the text of key unless it duplicates an indexed one.
+        Returns the key of the text it duplicates, or None. A key indexed
+        before (e.g. by an earlier run) is never its own duplicate; its
+        signature is replaced if its text changed.
+        """
+        signature = self.signature(lines)
+        if signature is None:
+            return None
+        original = self.query(signature, exclude=key)
+        if original is not None:
+            self._remove(key)
+            return original
+        if key not in self.signatures or not np.array_equal(self.signatures[key], signature):
+            self._insert(key, signature)
+        return None
+
+    def _params(self):
+        return np.array([self.num_perm, self.bands, self.shingle_size, self.seed], dtype=np.int64)
+
+    def save(self, path, keys=None):
+        """Writes the signatures of keys (default: all indexed ones) to path, atomically."""
+        keys = [key for key in (self.signatures if keys is None else keys) if key in self.signatures]
+        signatures = np.stack([self.signatures[key] for key in keys]) if keys else \
+            np.zeros((0, self.num_perm), dtype=np.uint64)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, params=self._params(), keys=np.array(keys, dtype=str), signatures=signatures)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Indexes the signatures saved at path. Returns how many."""
+        with np.load(path) as data:
+            if not np.array_equal(data["params"], self._params()):
+                raise ValueError(f"{path} was saved by an index with other parameters")
+            for key, signature in zip(data["keys"], data["signatures"]):
+                self._insert(str(key), signature)
+            return len(data["keys"])
+
+    def load_dir(self, directory):
+        """Loads every .npz file in directory, oldest first (names start with their creation time)."""
+        loaded = 0
+        for path in sorted(glob.glob(os.path.join(directory, "*.npz")),
+                           key=lambda p: int(os.path.basename(p).split("-")[0])):
+            loaded += self.load(path)
+        return loaded
@@ -0,0 +1,202 @@
+import fcntl
+import gzip
+import hashlib
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# Response headers kept next to each cached body
+STORED_HEADERS = ("ETag", "Last-Modified", "Content-Type", "Cache-Control", "Expires")
+# Total entry size, shared by every process writing to a cache directory, and its lock
+SIZE_FILE = "size"
+SIZE_LOCK = "size.lock"
+
+
+class PageCache:
+    """
+    On-disk cache of raw page responses, keyed by the SHA-256 of the URL.
+
+    Each entry is a gzip-compressed body (<key>.gz) plus a small JSON sidecar
+    (<key>.json) holding the URL, the validator headers and the fetch time, so
+    later runs can revalidate with If-None-Match / If-Modified-Since.
+    The cache is bounded by max_bytes; the least recently used entries are
+    evicted first (the sidecar mtime is bumped on every hit). The total size
+    is kept in a size file updated under a file lock, so crawl workers sharing
+    the directory enforce one bound together; eviction recounts the directory.
+    """
+    def __init__(self, cache_dir="data/page_cache", max_bytes=20 * 1024**3, compresslevel=6):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, url):
+        key = self.key(url)
+        shard = os.path.join(self.cache_dir, key[:2])
+        return os.path.join(shard, key + ".gz"), os.path.join(shard, key + ".json")
+
+    def get_meta(self, url):
+        _, meta_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, url):
+        """Returns (body_bytes, meta) for a cached url, or None."""
+        body_path, meta_path = self._paths(url)
+        meta = self.get_meta(url)
+        if meta is None:
+            return None
+        try:
+            with gzip.open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, EOFError):
+            return None
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        return body, meta
+
+    def conditional_headers(self, meta):
+        """Request headers that let the server answer 304 Not Modified."""
+        headers = {}
+        if meta is None:
+            return headers
+        stored = meta.get("headers", {})
+        if stored.get("ETag"):
+            headers["If-None-Match"] = stored["ETag"]
+        if stored.get("Last-Modified"):
+            headers["If-Modified-Since"] = stored["Last-Modified"]
+        return headers
+
+    def put(self, url, body, headers=None, method="http"):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        meta = {
+            "url": url,
+            "method": method,
+            "fetched_at": time.time(),
+            "headers": {h: headers[h.lower()] for h in STORED_HEADERS if headers.get(h.lower())},
+        }
+        old_size = self._entry_size(body_path, meta_path)
+
+        # Write to temp files and rename so readers in other processes never see partial entries
+        tmp_suffix = f".{os.getpid()}.tmp"
+        with gzip.open(body_path + tmp_suffix, "wb", compresslevel=self.compresslevel) as f:
+            f.write(body)
+        with open(meta_path + tmp_suffix, "w") as f:
+            json.dump(meta, f)
+        os.replace(body_path + tmp_suffix, body_path)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+        self._add_size(self._entry_size(body_path, meta_path) - old_size)
+
+    def touch(self, url):
+        """Marks a cached entry as freshly revalidated (after a 304)."""
+        _, meta_path = self._paths(url)
+        meta = self.get_meta(url)
+        if meta is None:
+            return
+        meta["fetched_at"] = time.time()
+        with open(meta_path + f".{os.getpid()}.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + f".{os.getpid()}.tmp", meta_path)
+
+    def iter_pages(self):
+        """Yields (url, body_bytes) for every cached entry, e.g. for re-extraction experiments."""
+        for meta_path in self._iter_meta_paths():
+            try:
+                with open(meta_path) as f:
+                    url = json.load(f)["url"]
+                with gzip.open(meta_path[:-len(".json")] + ".gz", "rb") as f:
+                    yield url, f.read()
+            except (OSError, ValueError, KeyError, EOFError):
+                continue
+
+    def _iter_meta_paths(self):
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                if name.endswith(".json"):
+                    yield os.path.join(shard_dir, name)
+
+    @staticmethod
+    def _entry_size(body_path, meta_path):
+        size = 0
+        for path in (body_path, meta_path):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _scan(self):
+        entries = []
+        for meta_path in self._iter_meta_paths():
+            body_path = meta_path[:-len(".json")] + ".gz"
+            try:
+                mtime = os.path.getmtime(meta_path)
+            except OSError:
+                continue
+            entries.append((mtime, self._entry_size(body_path, meta_path), body_path, meta_path))
+        return entries
+
+    @contextmanager
+    def _size_lock(self):
+        with open(os.path.join(self.cache_dir, SIZE_LOCK), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _add_size(self, delta):
+        """Adds delta bytes to the shared total, evicting once it is over max_bytes."""
+        size_path = os.path.join(self.cache_dir, SIZE_FILE)
+        with self._size_lock():
+            try:
+                with open(size_path) as f:
+                    size = int(f.read()) + delta
+            except (OSError, ValueError):
+                # First writer (or a cache from before the size file): count what is there, delta included
+                size = sum(size for _, size, _, _ in self._scan())
+            if size > self.max_bytes:
+                size = self._evict()
+            with open(size_path + f".{os.getpid()}.tmp", "w") as f:
+                f.write(str(size))
+            os.replace(size_path + f".{os.getpid()}.tmp", size_path)
+
+    def _evict(self):
+        """Evicts least recently used entries down to 90% of max_bytes. Returns the remaining size."""
+        # Recount rather than trust the running total, so drift between processes can't accumulate
+        target = int(self.max_bytes * 0.9)
+        entries = sorted(self._scan())
+        size = sum(entry_size for _, entry_size, _, _ in entries)
+        evicted = 0
+        for _, entry_size, body_path, meta_path in entries:
+            if size <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            size -= entry_size
+            evicted += 1
+        print(f"Page cache evicted {evicted} entries", file=sys.stderr)
+        return size
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import sys
+import time
+import unicodedata
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    query TEXT NOT NULL,
+    gl TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    organic TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (query, gl, page)
+);
+CREATE INDEX IF NOT EXISTS results_used ON results (used_at);
+"""
+
+
+def normalize_query(query):
+    """Cache key spelling of a search query: NFKC, lowercase, whitespace collapsed."""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+class SearchCache:
+    """
+    Persistent cache of search result pages in a SQLite database, keyed by
+    normalized query string, country (gl) and page number.
+
+    Entries older than ttl_days are treated as missing (pass max_age=None to
+    get() to serve them anyway). The cache is bounded by max_bytes of stored
+    results; the least recently used entries are evicted first. A hit only
+    writes its use time back once the stored one is touch_interval seconds
+    old, so repeated hits are reads.
+    """
+    def __init__(self, path="data/search_cache.sqlite", ttl_days=30, max_bytes=2 * 1024**3, touch_interval=3600):
+        self.path = path
+        self.ttl = ttl_days * 86400 if ttl_days else None
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.executescript(SCHEMA)
+        self._size = None
+
+    def get(self, query, gl, page, max_age="ttl"):
+        """Organic results of a cached page, or None. max_age (seconds) defaults to the TTL."""
+        max_age = self.ttl if max_age == "ttl" else max_age
+        key = (normalize_query(query), gl.lower(), int(page))
+        row = self.conn.execute(
+            "SELECT organic, fetched_at, used_at FROM results WHERE query = ? AND gl = ? AND page = ?", key).fetchone()
+        now = time.time()
+        if row is None or (max_age is not None and now - row[1] > max_age):
+            self.misses += 1
+            return None
+        if now - row[2] >= self.touch_interval:
+            self.conn.execute("UPDATE results SET used_at = ? WHERE query = ? AND gl = ? AND page = ?", (now,) + key)
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, query, gl, page, organic):
+        key = (normalize_query(query), gl.lower(), int(page))
+        data = json.dumps(organic)
+        now = time.time()
+        old = self.conn.execute(
+            "SELECT size FROM results WHERE query = ? AND gl = ? AND page = ?", key).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (query, gl, page, organic, size, fetched_at, used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", key + (data, len(data), now, now))
+        if self._size is not None:
+            self._size += len(data) - (old[0] if old else 0)
+        self._maybe_evict()
+
+    def _maybe_evict(self):
+        if self._size is None:
+            self._size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if self._size <= self.max_bytes:
+            return
+        # Evict down to 90% of the bound so we don't evict on every put
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute("SELECT rowid, size FROM results ORDER BY used_at")
+            doomed = []
+            for rowid, size in rows:
+                if self._size <= target:
+                    break
+                doomed.append((rowid,))
+                self._size -= size
+            self.conn.executemany("DELETE FROM results WHERE rowid = ?", doomed)
+            evicted = len(doomed)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            self._size = None
+            raise
+        print(f"Search cache evicted {evicted} entries", file=sys.stderr)
+
+    def purge_expired(self):
+        """Deletes entries older than the TTL. Returns how many."""
+        if self.ttl is None:
+            return 0
+        deleted = self.conn.execute("DELETE FROM results WHERE fetched_at < ?", (time.time() - self.ttl,)).rowcount
+        self._size = None
+        return deleted
+
+    def stats(self):
+        entries, size, oldest = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(fetched_at) FROM results").fetchone()
+        expired = self.conn.execute("SELECT COUNT(*) FROM results WHERE fetched_at < ?",
+                                    (time.time() - self.ttl,)).fetchone()[0] if self.ttl else 0
+        return {"entries": entries, "bytes": size, "expired": expired,
+                "oldest_days": round((time.time() - oldest) / 86400, 1) if oldest else None}
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Show or prune the search-result cache")
+    parser.add_argument('--cache', type=str, default='data/search_cache.sqlite')
+    parser.add_argument('--ttl_days', type=float, default=30)
+    parser.add_argument('--purge_expired', action='store_true', help='Delete entries older than --ttl_days')
+    args = parser.parse_args()
+    cache = SearchCache(args.cache, ttl_days=args.ttl_days)
+    if args.purge_expired:
+        print(f"Purged {cache.purge_expired()} expired entries", file=sys.stderr)
+    print(json.dumps(cache.stats()))
+    cache.close()
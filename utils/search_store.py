@@ -0,0 +1,246 @@
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+# Integer columns, one entry per search result, sorted by claim
+ROW_COLUMNS = {
+    "claim": np.int32,   # index into claims
+    "query": np.int32,   # index into queries
+    "page": np.int16,
+    "rank": np.int16,
+    "url": np.int32,     # index into urls
+}
+# Interned string tables, and per-row strings (aligned with the row columns)
+INTERNED_TABLES = ("claims", "queries", "urls")
+ROW_STRINGS = ("titles", "snippets", "dates")
+# Size and mtime of the search_results.json a store was built from
+SOURCE_FILE = "source.json"
+
+
+class StringTable:
+    """Read-only list of strings stored as one UTF-8 blob plus offsets (both memory-mapped)."""
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @staticmethod
+    def write(path, strings):
+        offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+        encoded = [s.encode("utf-8") for s in strings]
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        np.save(path + ".offsets.npy", offsets)
+        np.save(path + ".blob.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+    @classmethod
+    def open(cls, path):
+        return cls(np.load(path + ".blob.npy", mmap_mode="r"), np.load(path + ".offsets.npy", mmap_mode="r"))
+
+
+class SearchStore:
+    """
+    Columnar, memory-mapped store of search results:
+    (claim, query, page, rank, url, title, snippet, date) per result.
+
+    Claims, queries and URLs are interned; rows are sorted by claim so that a
+    claim's results are one contiguous slice (claim_offsets). Everything is
+    opened with mmap, so processes reading the same store share the OS page
+    cache, and pickling a SearchStore only sends its path.
+    """
+    def __init__(self, path="data/search_store"):
+        self.path = path
+        self.rows = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r") for name in ROW_COLUMNS}
+        self.claim_offsets = np.load(os.path.join(path, "claim_offsets.npy"), mmap_mode="r")
+        self.claim_ids = np.load(os.path.join(path, "claim_ids.npy"), mmap_mode="r")
+        for name in INTERNED_TABLES + ROW_STRINGS:
+            setattr(self, name, StringTable.open(os.path.join(path, name)))
+        self._claim_index = None
+
+    def __getstate__(self):
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def __len__(self):
+        return len(self.rows["url"])
+
+    def claim_index(self, claim):
+        """Index of a claim text in the claims table (KeyError if it has no results)."""
+        if self._claim_index is None:
+            self._claim_index = {text: i for i, text in enumerate(self.claims)}
+        return self._claim_index[claim]
+
+    def __contains__(self, claim):
+        try:
+            self.claim_index(claim)
+            return True
+        except KeyError:
+            return False
+
+    def claim_rows(self, claim):
+        i = self.claim_index(claim)
+        return range(self.claim_offsets[i], self.claim_offsets[i + 1])
+
+    def iter_claim_results(self, claim):
+        """Yields (query, page_num, url) for every search result of a claim, like the nested JSON walk."""
+        queries, pages, urls = self.rows["query"], self.rows["page"], self.rows["url"]
+        for row in self.claim_rows(claim):
+            yield self.queries[queries[row]], str(pages[row]), self.urls[urls[row]]
+
+    def iter_rows(self, claim=None):
+        """Yields every result (or a claim's results) as a dict of all columns."""
+        rows = range(len(self)) if claim is None else self.claim_rows(claim)
+        for row in rows:
+            claim_idx = int(self.rows["claim"][row])
+            yield {
+                "claim": self.claims[claim_idx],
+                "claim_id": int(self.claim_ids[claim_idx]),
+                "query": self.queries[self.rows["query"][row]],
+                "page": int(self.rows["page"][row]),
+                "rank": int(self.rows["rank"][row]),
+                "url": self.urls[self.rows["url"][row]],
+                "title": self.titles[row],
+                "snippet": self.snippets[row],
+                "date": self.dates[row],
+            }
+
+    def claim_results(self, claim):
+        """A claim's results in the nested {query: {page: [result, ...]}} layout of search_results.json."""
+        nested = {}
+        for result in self.iter_rows(claim):
+            nested.setdefault(result["query"], {}).setdefault(str(result["page"]), []).append({
+                "title": result["title"],
+                "link": result["url"],
+                "snippet": result["snippet"],
+                "date": result["date"],
+                "position": result["rank"],
+            })
+        return nested
+
+
+def convert_search_results(search_results, path="data/search_store", dataset=None, source=None):
+    """
+    Writes a SearchStore at path from the nested search_results.json dict
+    (claim -> query -> page -> results). dataset, if given, maps claim texts
+    to their claim_id (-1 for claims not in it). source, the source_stamp of
+    the JSON file, is recorded so the store can be rebuilt when it changes.
+    """
+    os.makedirs(path, exist_ok=True)
+    claim_ids = {}
+    for claim_object in dataset or []:
+        claim_ids[claim_object["claim"]] = claim_object["claim_id"]
+
+    columns = {name: [] for name in ROW_COLUMNS}
+    strings = {name: [] for name in ROW_STRINGS}
+    interned = {name: {} for name in INTERNED_TABLES}
+    claim_offsets = [0]
+
+    def intern(table, value):
+        return interned[table].setdefault(value, len(interned[table]))
+
+    for claim, queries in search_results.items():
+        claim_idx = intern("claims", claim)
+        for query, pages in queries.items():
+            query_idx = intern("queries", query)
+            for page, results in pages.items():
+                for i, result in enumerate(results):
+                    columns["claim"].append(claim_idx)
+                    columns["query"].append(query_idx)
+                    columns["page"].append(int(page))
+                    columns["rank"].append(result.get("position", i + 1))
+                    columns["url"].append(intern("urls", result["link"]))
+                    strings["titles"].append(result.get("title") or "")
+                    strings["snippets"].append(result.get("snippet") or "")
+                    strings["dates"].append(result.get("date") or "")
+        claim_offsets.append(len(columns["url"]))
+
+    for name, dtype in ROW_COLUMNS.items():
+        np.save(os.path.join(path, name + ".npy"), np.asarray(columns[name], dtype=dtype))
+    np.save(os.path.join(path, "claim_offsets.npy"), np.asarray(claim_offsets, dtype=np.int64))
+    np.save(os.path.join(path, "claim_ids.npy"),
+            np.asarray([claim_ids.get(claim, -1) for claim in interned["claims"]], dtype=np.int64))
+    for name in INTERNED_TABLES:
+        StringTable.write(os.path.join(path, name), list(interned[name]))
+    for name in ROW_STRINGS:
+        StringTable.write(os.path.join(path, name), strings[name])
+    if source is not None:
+        with open(os.path.join(path, SOURCE_FILE), "w") as f:
+            json.dump(source, f)
+    print(f"Wrote {len(columns['url'])} search results ({len(interned['urls'])} unique URLs, "
+          f"{len(interned['queries'])} queries, {len(interned['claims'])} claims) to {path}", file=sys.stderr)
+    return SearchStore(path)
+
+
+def source_stamp(json_path):
+    """Identity of a search_results.json version: its path, size and mtime."""
+    stat = os.stat(json_path)
+    return {"path": os.path.abspath(json_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def _stored_stamp(store_path):
+    try:
+        with open(os.path.join(store_path, SOURCE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_search_results(json_path="data/search_results.json", store_path="data/search_store", dataset=None):
+    """
+    Opens the SearchStore at store_path, converting json_path into it first if
+    it doesn't exist yet or was built from a different version of json_path
+    (size or mtime changed, e.g. after more queries were searched).
+    """
+    built = os.path.exists(os.path.join(store_path, "claim_offsets.npy"))
+    if built and not os.path.exists(json_path):
+        return SearchStore(store_path)
+    source = source_stamp(json_path)
+    stored = _stored_stamp(store_path) if built else None
+    if built and stored is not None and (stored["size"], stored["mtime"]) == (source["size"], source["mtime"]):
+        return SearchStore(store_path)
+    if built:
+        print(f"{json_path} changed since {store_path} was built, rebuilding it", file=sys.stderr)
+    with open(json_path) as f:
+        search_results = json.load(f)
+    # Build next to the store and swap it in: processes with the old store mmapped keep reading the old files
+    tmp_path = f"{store_path}.tmp-{os.getpid()}"
+    convert_search_results(search_results, tmp_path, dataset, source=source)
+    if built:
+        old_path = f"{store_path}.old-{os.getpid()}"
+        os.rename(store_path, old_path)
+        os.rename(tmp_path, store_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+    else:
+        if os.path.isdir(store_path):
+            shutil.rmtree(store_path)
+        os.rename(tmp_path, store_path)
+    return SearchStore(store_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert search_results.json into a columnar SearchStore")
+    parser.add_argument('--search_results', type=str, default='data/search_results.json')
+    parser.add_argument('--dataset', type=str, default='data/dataset_politifact.json')
+    parser.add_argument('--store', type=str, default='data/search_store')
+    args = parser.parse_args()
+    with open(args.search_results) as f:
+        search_results = json.load(f)
+    dataset = None
+    if os.path.exists(args.dataset):
+        with open(args.dataset) as f:
+            dataset = json.load(f)
+    convert_search_results(search_results, args.store, dataset, source=source_stamp(args.search_results))
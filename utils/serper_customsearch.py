@@ -1,95 +1,209 @@
 import requests
 import json
-from itertools import cycle
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from utils.search_cache import SearchCache
+
+
+class KeysExhausted(Exception):
+    pass
+
+
+class SerperKeyPool:
+    """
+    Thread-safe pool of Serper API keys ({"api_key", "remaining_requests"} dicts
+    from the secrets file). Each request leases the key with the most quota
+    left after its in-flight requests, so load follows the remaining quota and
+    a key is never leased past it. Completed requests are charged to their key;
+    requests that never got an answer are refunded. The remaining quota is
+    written back to the secrets file every save_every charged requests.
+    """
+    def __init__(self, secrets_file, save_every=10):
+        self.secrets_file = secrets_file
+        self.save_every = save_every
+        with open(secrets_file) as fp:
+            self.secrets = json.load(fp)
+        self.remaining = {s["api_key"]: s["remaining_requests"] for s in self.secrets}
+        self.in_flight = dict.fromkeys(self.remaining, 0)
+        self.charged = 0
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        print("Serper keys:", sum(1 for r in self.remaining.values() if r > 0), "usable,",
+              sum(max(0, r) for r in self.remaining.values()), "calls remaining")
+
+    def lease(self):
+        with self._lock:
+            while True:
+                available = {key: self.remaining[key] - self.in_flight[key] for key in self.remaining}
+                api_key = max(available, key=available.get, default=None)
+                if api_key is not None and available[api_key] > 0:
+                    self.in_flight[api_key] += 1
+                    return api_key
+                if not any(self.in_flight.values()):
+                    raise KeysExhausted("All Serper API keys are depleted")
+                # Every key is fully leased: wait for a refund or a depleted key to settle
+                self._released.wait()
+
+    def release(self, api_key, charged=True, depleted=False):
+        with self._lock:
+            self.in_flight[api_key] -= 1
+            if depleted:
+                if self.remaining[api_key] > 0:
+                    print(f"Serper key ****{api_key[-5:]} depleted")
+                self.remaining[api_key] = 0
+            elif charged:
+                self.remaining[api_key] -= 1
+                self.charged += 1
+                if self.charged % self.save_every == 0:
+                    self._save()
+            self._released.notify_all()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        for secret in self.secrets:
+            secret["remaining_requests"] = max(0, self.remaining[secret["api_key"]])
+        tmp_path = self.secrets_file + ".tmp"
+        with open(tmp_path, "w") as fp:
+            json.dump(self.secrets, fp, indent=4)
+        os.replace(tmp_path, self.secrets_file)
+
 
 class SerperCustomSearch:
-    def __init__(self, secrets_file):
-        self.serper_api_counter = 0
+    """
+    Serper search client. fetch_results searches one query; fetch_many keeps
+    up to max_concurrency page requests in flight over one pooled HTTP session,
+    each with a key leased from the SerperKeyPool. Both return pages as
+    {page: organic results}; a page whose search failed is [].
+
+    Result pages are cached in a SearchCache at cache_path (None disables it)
+    by normalized query, country and page, and served from it for
+    cache_ttl_days. cache_mode 'use' reads and fills the cache, 'refresh'
+    searches everything again and overwrites it, and 'only' never calls the
+    API (no secrets file needed): it serves every cached page regardless of
+    age and returns [] for the others, for reproducible offline runs.
+    """
+    def __init__(self, secrets_file, max_concurrency=16, max_retries=2, timeout=30,
+                 cache_path="data/search_cache.sqlite", cache_ttl_days=30, cache_max_mb=2048, cache_mode="use"):
+        if cache_mode not in ("use", "refresh", "only"):
+            raise ValueError(f"Unknown cache_mode {cache_mode!r}")
+        if cache_mode != "use" and cache_path is None:
+            raise ValueError(f"cache_mode {cache_mode!r} needs a cache_path")
         self.serper_url = "https://google.serper.dev/search"
         self.secrets_file = secrets_file
-        self.keys_pool = self._load_secrets(self.secrets_file)
-        self._rotate_secret() # Initialize the first secret
-
-    def _load_secrets(self, secrets_file):
-        with open(secrets_file) as fp:
-            serper_api_secrets = json.load(fp)
-        return cycle(serper_api_secrets)
-    
-    def _rotate_secret(self):
-        # Keep rotating until we find a secret with available calls
-        while True:
-            current_secret = next(self.keys_pool)
-            if current_secret["remaining_requests"] > 0:
-                self.api_key = current_secret["api_key"]
-                self.max_calls = current_secret["remaining_requests"]
-                self.request_counter = 0
-                print("Changed Serper search SECRET, ", self.max_calls, " calls remaining")
-                break
-            print("Skipping depleted API key")
-
-    def _update_secrets_file(self):
-        # Read current secrets
-        with open(self.secrets_file) as fp:
-            secrets = json.load(fp)
-        
-        # Update the remaining_requests for current API key
-        for secret in secrets:
-            if secret["api_key"] == self.api_key:
-                secret["remaining_requests"] = self.max_calls
-                break
-        
-        # Write back to file
-        with open(self.secrets_file, 'w') as fp:
-            json.dump(secrets, fp, indent=4)
-    
-    # def _rotate_secret(self):
-    #     current_secret = next(self.keys_pool)
-    #     self.api_key = current_secret["api_key"]
-    #     self.max_calls = current_secret["remaining_requests"]
-    #     print("Changing Serper search SECRET")
+        self.cache_mode = cache_mode
+        self.cache = None
+        if cache_path is not None:
+            self.cache = SearchCache(cache_path, ttl_days=cache_ttl_days, max_bytes=cache_max_mb * 1024**2)
+        self.keys = SerperKeyPool(secrets_file) if cache_mode != "only" else None
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
 
     def _get_serper_search_results(self, search_string, location_ISO_code, page):
-        headers = {
-            'X-API-KEY': self.api_key,
-            'Content-Type': 'application/json'
-        }
-        
         payload = json.dumps({
             "q": search_string,
             "gl": location_ISO_code.lower(),
             "page": page
         })
-        # print(payload, self.api_key)
-
-        try:
-            response = requests.post(self.serper_url, headers=headers, data=payload)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"Search failed: {str(e)}")
-            return {"organic": []}
-        
+        attempt = 0
+        while attempt <= self.max_retries:
+            api_key = self.keys.lease()
+            headers = {
+                'X-API-KEY': api_key,
+                'Content-Type': 'application/json'
+            }
+            try:
+                response = self.session.post(self.serper_url, headers=headers, data=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.keys.release(api_key, charged=False)
+                print(f"Search failed: {str(e)}")
+                attempt += 1
+                time.sleep(2 ** attempt)
+                continue
+            # Invalid key or out of credits: drop the key and retry with another one (not counted as an attempt)
+            if response.status_code in (401, 403) or (response.status_code == 400 and "credits" in response.text.lower()):
+                self.keys.release(api_key, depleted=True)
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                self.keys.release(api_key, charged=False)
+                print(f"Search failed: HTTP {response.status_code}, retrying")
+                attempt += 1
+                time.sleep(2 ** attempt)
+                continue
+            self.keys.release(api_key)
+            try:
+                response.raise_for_status()
+                return response.json()
+            except Exception as e:
+                print(f"Search failed: {str(e)}")
+                return None
+        return None
+
     def update_final_state(self):
         """Update the secrets file one final time to persist the final state"""
-        self._update_secrets_file()
-    
+        if self.keys is not None:
+            self.keys.save()
 
     def fetch_results(self, search_string, pages_before_date, location_ISO_code, n_pages):
-        search_results = {}
         search_string = f"{search_string}"
         # search_string = f"{search_string} before:{pages_before_date}"
-        
-        for page_num in range(n_pages):
-            if self.max_calls <= 0 or not self.api_key:
-                self._update_secrets_file()  # Update before rotating
-                self._rotate_secret()
-            
-            page_results = self._get_serper_search_results(search_string, location_ISO_code, page_num+1)
-            search_results[page_num+1] = page_results["organic"]
-            self.max_calls -= 1
-            self.request_counter += 1
-            
-            # Update secrets file every 10 requests
-            if self.request_counter % 10 == 0:
-                self._update_secrets_file()
+        return self.fetch_many([search_string], location_ISO_code, n_pages)[search_string]
+
+    def fetch_many(self, search_strings, location_ISO_code="US", n_pages=1):
+        """
+        Searches every query in search_strings (n_pages pages each) concurrently,
+        taking the pages it can from the cache. Returns
+        {search_string: {page: organic results}} with pages in order.
+        """
+        search_strings = list(dict.fromkeys(search_strings))
+        requests_ = [(search_string, page_num + 1) for search_string in search_strings for page_num in range(n_pages)]
+        pages = {}
+        to_fetch = []
+        not_cached = 0
+        for search_string, page in requests_:
+            organic = None
+            if self.cache is not None and self.cache_mode != "refresh":
+                organic = self.cache.get(search_string, location_ISO_code, page,
+                                         max_age=None if self.cache_mode == "only" else "ttl")
+            if organic is not None:
+                pages[(search_string, page)] = organic
+            elif self.cache_mode == "only":
+                pages[(search_string, page)] = []
+                not_cached += 1
+            else:
+                to_fetch.append((search_string, page))
+        if self.cache is not None:
+            print(f"Search cache: {len(requests_) - len(to_fetch) - not_cached} pages cached, "
+                  f"{len(to_fetch)} to search" + (f", {not_cached} not cached" if not_cached else ""))
+        exhausted = []
+
+        def search(request):
+            search_string, page = request
+            try:
+                return self._get_serper_search_results(search_string, location_ISO_code, page)
+            except KeysExhausted:
+                exhausted.append(request)
+                return None
+
+        if to_fetch:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                # Results come back in request order; each is cached as soon as it is in
+                for request, result in zip(to_fetch, executor.map(search, to_fetch)):
+                    pages[request] = [] if result is None else result.get("organic", [])
+                    if result is not None and self.cache is not None:
+                        self.cache.put(request[0], location_ISO_code, request[1], pages[request])
+        if exhausted:
+            print(f"Search failed for {len(exhausted)} pages: all Serper API keys are depleted")
+        search_results = {search_string: {} for search_string in search_strings}
+        for search_string, page in requests_:
+            search_results[search_string][page] = pages[(search_string, page)]
         return search_results
@@ -0,0 +1,216 @@
+import os
+import re
+import sys
+from collections import Counter
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+import numpy as np
+
+# Blacklists
+BLACKLIST_DOMAINS = {
+    "jstor.org",
+    "facebook.com",
+    "twitter.com",
+    "x.com",
+    "reddit.com",
+    "linkedin.com",
+    "threads.net",
+    "quora.com",
+    "tiktok.com",
+    "instagram.com",
+    "discord.com",
+    "youtube.com",
+    "spotify.com",
+    "huggingface.co",
+    "politifact.com",
+    "snopes.com",
+    "factcheck.org",
+    "shutterstock.com",
+    "naturepl.com",
+    "example.com",
+    "pinterest.com",
+    "flickr.com",
+    "twitch.tv",
+    "verifythis.com",
+    "telegram.org",
+    "factcheck.africa",
+    "washingtonpost.com",
+    "reuters.com",
+    "nytimes.com"
+}
+
+BLACKLIST_FILES = [
+    "/glove.",
+    "ftp://ftp.cs.princeton.edu/pub/cs226/autocomplete/words-333333.txt",
+    "https://web.mit.edu/adamrose/Public/googlelist",
+]
+BLACKLIST_SUFFIXES = (".txt",)
+
+# Query parameters that only track where a click came from; dropped by normalize_url
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "gclsrc", "dclid", "msclkid", "yclid", "twclid", "igshid",
+    "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "oly_anon_id", "oly_enc_id",
+    "ref_src", "ref_url", "cmpid", "smid", "spm", "vero_id", "wickedid", "s_cid",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+# All file blacklist entries as one regex, so a link is scanned once
+_BLACKLIST_FILES_RE = re.compile("|".join(
+    [re.escape(b_file) for b_file in BLACKLIST_FILES] +
+    [re.escape(suffix) + r"\Z" for suffix in BLACKLIST_SUFFIXES]))
+
+_DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+# Public suffix list used for registrable domains: a local copy if PUBLIC_SUFFIX_LIST names one,
+# else the snapshot pinned in the installed tldextract. It is never fetched over the network
+# (tldextract's default), which stalls every worker on an offline machine.
+PUBLIC_SUFFIX_LIST = os.environ.get("PUBLIC_SUFFIX_LIST")
+
+_extractor = None
+
+
+def suffix_extractor():
+    """The shared tldextract extractor, created (and its suffix list parsed) on first use."""
+    global _extractor
+    if _extractor is None:
+        import tldextract
+        urls = ("file://" + os.path.abspath(PUBLIC_SUFFIX_LIST),) if PUBLIC_SUFFIX_LIST else ()
+        extractor = tldextract.TLDExtract(suffix_list_urls=urls, cache_dir=None, fallback_to_snapshot=True)
+        extractor("example.com")
+        _extractor = extractor
+    return _extractor
+
+
+@lru_cache(maxsize=1 << 18)
+def _split_host(host):
+    extracted = suffix_extractor()(host)
+    return extracted.subdomain, extracted.domain, extracted.suffix
+
+
+def _host(url):
+    if '://' not in url:
+        url = 'http://' + url
+    try:
+        return urlsplit(url).hostname or ""
+    except ValueError:
+        return ""
+
+
+def get_domain_name(url, include_subdomain=False):
+    """Registrable domain of url (e.g. bbc.co.uk), memoized per host."""
+    subdomain, domain, suffix = _split_host(_host(url))
+    if include_subdomain and subdomain:
+        return f"{subdomain}.{domain}.{suffix}"
+    return f"{domain}.{suffix}"
+
+
+@lru_cache(maxsize=1 << 20)
+def filter_reason(link):
+    """Why link is blacklisted ('domain' or 'file'), or None if it may be crawled."""
+    if get_domain_name(link) in BLACKLIST_DOMAINS:
+        return "domain"
+    if _BLACKLIST_FILES_RE.search(link):
+        return "file"
+    return None
+
+
+def should_filter_link(link):
+    return filter_reason(link) is not None
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+@lru_cache(maxsize=1 << 20)
+def normalize_url(url):
+    """
+    Canonical spelling of a URL, so that trivially different spellings of one
+    page crawl once: lowercase scheme and host, no default port, 'www.' or
+    fragment, no tracking parameters and no trailing slash. A URL without a
+    scheme is taken to start with its host; one without a host is returned as is.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if not parts.scheme and not parts.netloc:
+        parts = urlsplit("//" + url)
+    if not parts.netloc:
+        return url
+    scheme = parts.scheme.lower() or "http"
+    netloc = parts.netloc.lower()
+    if scheme in _DEFAULT_PORTS and netloc.endswith(_DEFAULT_PORTS[scheme]):
+        netloc = netloc[:-len(_DEFAULT_PORTS[scheme])]
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+    query = parts.query
+    if query:
+        query = "&".join(param for param in query.split("&")
+                         if param and not is_tracking_param(param.split("=", 1)[0]))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+def classify_urls(urls):
+    """
+    Filters and normalizes a list of URLs, each distinct URL once. Returns a
+    boolean array (True for URLs to keep) and their normalized spellings (None
+    for filtered URLs), both aligned with urls.
+    """
+    verdicts = {}
+    reasons = Counter()
+    for url in urls:
+        if url not in verdicts:
+            reason = filter_reason(url)
+            reasons[reason] += 1
+            verdicts[url] = None if reason else normalize_url(url)
+    normalized = [verdicts[url] for url in urls]
+    keep = np.fromiter((norm_url is not None for norm_url in normalized), dtype=bool, count=len(normalized))
+    if reasons["domain"] or reasons["file"]:
+        print(f"Blacklisted {reasons['domain']} URLs by domain and {reasons['file']} by file "
+              f"out of {len(verdicts)} unique", file=sys.stderr)
+    return keep, normalized
+
+
+def filter_search_results(search_results, claims=None):
+    """
+    Non-blacklisted (query, page_num, url) entries of every claim (or of the
+    given claims) in one pass, from a SearchStore or the nested search_results
+    dict. Returns {claim: entries}. For a SearchStore the URL table is classified
+    once and the rows are selected with one mask.
+    """
+    if hasattr(search_results, "claim_offsets"):
+        return _filter_search_store(search_results, claims)
+
+    if claims is None:
+        claims = list(search_results)
+    rows = []
+    for claim in claims:
+        for query, page_results in search_results.get(claim, {}).items():
+            for page_num, results in page_results.items():
+                for result in results:
+                    rows.append((claim, query, page_num, result["link"]))
+    keep, _ = classify_urls([row[3] for row in rows])
+    filtered = {claim: [] for claim in claims}
+    for (claim, query, page_num, url), kept in zip(rows, keep):
+        if kept:
+            filtered[claim].append((query, page_num, url))
+    return filtered
+
+
+def _filter_search_store(store, claims=None):
+    url_keep, _ = classify_urls(list(store.urls))
+    row_keep = url_keep[store.rows["url"]]
+    queries, pages, urls = store.rows["query"], store.rows["page"], store.rows["url"]
+    filtered = {}
+    for claim in (store.claims if claims is None else claims):
+        if claim not in store:
+            filtered[claim] = []
+            continue
+        claim_rows = store.claim_rows(claim)
+        rows = np.flatnonzero(row_keep[claim_rows.start:claim_rows.stop]) + claim_rows.start
+        filtered[claim] = [(store.queries[queries[row]], str(pages[row]), store.urls[urls[row]]) for row in rows]
+    return filtered
@@ -1,81 +1,207 @@
-import argparse
-import os
 from time import sleep
 import trafilatura
 import sys
-import json
-import pymupdf 
-import subprocess
-import tempfile
-import os
-import filetype
-
-from io import BytesIO
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import TimeoutException, WebDriverException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor
 from trafilatura.settings import DEFAULT_CONFIG
 from trafilatura.meta import reset_caches
+from trafilatura.utils import decode_file
+import requests
+from utils.http_fetcher import fetch_pages, DEFAULT_HEADERS, VERIFY_TLS
+from utils.deadline import deadline, budget, check_deadline, DeadlineExceeded
+from utils.crawl_metrics import trace_url, stage, note, fail
+from utils.content_router import NotHtml, SNIFF_BYTES, MAX_BYTES, DOC_EXTENSIONS, route_response, declared_size
+
+# decode_file caps what it decompresses at trafilatura's MAX_FILE_SIZE; keep it at our largest body limit
+DEFAULT_CONFIG['DEFAULT']['MAX_FILE_SIZE'] = str(max(MAX_BYTES.values()))
+
+# Documents (PDF, TXT, DOCX): page cap, and the page count from which pages
+# are extracted by several processes
+DOC_MAX_PAGES = 500
+DOC_PARALLEL_PAGES = 64
+DOC_WORKERS = 4
+
+# One in-page pass over the consent banner: known CMP buttons first, then any visible
+# button/link whose text reads like "accept" and that sits inside a cookie/consent
+# container, then a bare accept-like <button>. Returns what was clicked, or null.
+CONSENT_SCRIPT = """
+const selectors = [
+    '#onetrust-accept-btn-handler', '#accept-recommended-btn-handler',
+    '#didomi-notice-agree-button', '#truste-consent-button',
+    '#CybotCookiebotDialogBodyLevelButtonLevelOptinAllowAll', '#CybotCookiebotDialogBodyButtonAccept',
+    '.qc-cmp2-summary-buttons button[mode="primary"]', 'button.fc-cta-consent',
+    '[data-testid="uc-accept-all-button"]', '.cc-allow', '.cc-dismiss',
+];
+const visible = el => el.getClientRects().length > 0;
+for (const selector of selectors) {
+    const el = document.querySelector(selector);
+    if (el && visible(el)) { el.click(); return selector; }
+}
+const accept = /^(accept|allow|agree|i agree|got it|ok|okay|consent|continue|akzeptieren|alle akzeptieren|zustimmen|accepter|tout accepter|j'accepte|aceptar|accetta|accetto|aceitar)\\b/i;
+const banner = /cookie|consent|gdpr|privacy|cmp|notice/i;
+let fallback = null;
+for (const el of document.querySelectorAll('button, a, [role="button"], input[type="button"], input[type="submit"]')) {
+    const text = (el.innerText || el.value || '').trim();
+    if (!text || text.length > 40 || !accept.test(text) || !visible(el)) continue;
+    for (let node = el, depth = 0; node && depth < 8; node = node.parentElement, depth++) {
+        const cls = typeof node.className === 'string' ? node.className : '';
+        if (banner.test((node.id || '') + ' ' + cls)) { el.click(); return text; }
+    }
+    if (!fallback && el.tagName === 'BUTTON' && !/^(ok|okay|continue)$/i.test(text)) fallback = el;
+}
+if (fallback) { fallback.click(); return fallback.innerText.trim(); }
+return null;
+"""
+
+# Consent dialogs served from their own (cross-origin) iframe
+CONSENT_FRAME_SCRIPT = """
+return Array.from(document.querySelectorAll('iframe')).filter(
+    f => /consent|cmp|privacy|sp_message|cookie/i.test((f.id || '') + ' ' + (f.src || ''))).slice(0, 2);
+"""
+
+# trafilatura's module caches are cleared every this many extractions rather than after each one:
+# clearing throws the warm parser state away, and worker recycling (utils.worker_pool) bounds memory
+RESET_CACHES_EVERY = 100
+_extractions = 0
+
+def html2lines(page, favor_recall=True, favor_precision=False):
+    """Extracts the main text of an HTML page as a list of lines (module-level so process pools can run it)."""
+    global _extractions
+    if page is None or len(page.strip()) == 0:
+        return []
+    try:
+        text = trafilatura.extract(page, favor_recall=favor_recall, favor_precision=favor_precision,
+                                   with_metadata=False)
+        _extractions += 1
+        if _extractions % RESET_CACHES_EVERY == 0:
+            reset_caches()
+        if text is None:
+            return []
+        return text.split("\n")
+    except Exception as e:
+        print(e)
+        return []
+
+def read_capped(chunks, max_bytes, data=b""):
+    """Joins streamed chunks after data, or returns None once they add up to more than max_bytes."""
+    data = bytearray(data)
+    for chunk in chunks:
+        data += chunk
+        if len(data) > max_bytes:
+            return None
+        check_deadline("download")
+    return bytes(data)
+
+def read_routed(url, response):
+    """
+    Reads a streamed requests response within the byte limit of its route and
+    returns the HTML body. Documents, and content that is skipped or too large,
+    raise NotHtml; unusable content is dropped after its first chunk.
+    """
+    content_type = response.headers.get("Content-Type")
+    chunks = response.iter_content(SNIFF_BYTES)
+    head = next(chunks, b"")
+    route = route_response(url, content_type, head)
+    if route == "skip":
+        raise NotHtml(url, route, content_type)
+    max_size = MAX_BYTES[route]
+    body = None
+    if declared_size(response.headers) <= max_size:
+        body = read_capped(chunks, max_size, head)
+    if body is None:
+        raise NotHtml(url, "skip", content_type, reason="too_large")
+    if route == "document":
+        raise NotHtml(url, route, content_type, body)
+    return body
 
-# Increase max file size to 50MB
-DEFAULT_CONFIG['DEFAULT']['MAX_FILE_SIZE'] = "50000000"
-DEFAULT_CONFIG['DEFAULT']['SLEEP_TIME'] = "5"
+def download_document(url, max_bytes=MAX_BYTES["document"], chunk_size=1 << 16):
+    """Streams a document into memory, giving up once it is larger than max_bytes."""
+    timeout = max(1, budget(30))
+    with requests.get(url, headers=DEFAULT_HEADERS, stream=True, timeout=timeout, verify=VERIFY_TLS) as response:
+        response.raise_for_status()
+        data = None
+        if declared_size(response.headers) <= max_bytes:
+            data = read_capped(response.iter_content(chunk_size), max_bytes)
+        if data is None:
+            raise ValueError(f"Document larger than {max_bytes} bytes")
+        return data
+
+def _extract_page_range(data, ftype, start, stop):
+    import pymupdf
+    with pymupdf.open(stream=data, filetype=ftype) as reader:
+        return [reader[i].get_text() for i in range(start, stop)]
+
+def document2lines(data, max_pages=DOC_MAX_PAGES, workers=DOC_WORKERS):
+    """
+    Extracts the text of an in-memory PDF/TXT/DOCX document as a list of lines,
+    reading at most max_pages pages. Long documents are split into page ranges
+    extracted by worker processes (pymupdf documents can't be shared across threads).
+    """
+    import filetype
+    import pymupdf
+    kind = filetype.guess(data)
+    ftype = kind.extension if kind else "txt"
+    print(f"Using Extension {ftype}")
+    with pymupdf.open(stream=data, filetype=ftype) as reader:
+        n_pages = min(reader.page_count, max_pages)
+        # Daemonic pool workers can't start processes of their own
+        if (n_pages < DOC_PARALLEL_PAGES or workers <= 1
+                or multiprocessing.current_process().daemon):
+            texts = [reader[i].get_text() for i in range(n_pages)]
+            return "".join(texts).split("\n")
+
+    step = -(-n_pages // workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_extract_page_range, data, ftype, start, min(start + step, n_pages))
+                   for start in range(0, n_pages, step)]
+        texts = [text for future in futures for text in future.result()]
+    return "".join(texts).split("\n")
 
 class WebpageProcessor:
-    def __init__(self):
+    def __init__(self, page_cache=None, cache_mode='revalidate', browser_pool=None, render_mode='fast',
+                 doc_workers=DOC_WORKERS):
+        """
+        page_cache: optional utils.page_cache.PageCache holding raw responses.
+        cache_mode: 'revalidate' sends a conditional request for cached pages,
+                    'prefer' serves cached pages without touching the network.
+        browser_pool: optional utils.browser_pool.BrowserPool to lease warm drivers
+                      from instead of owning a single driver.
+        render_mode: 'fast' dismisses consent banners with one in-page script and
+                     scrolls only while the page keeps growing (drivers block fonts,
+                     media and trackers); 'thorough' runs the XPath cookie-popup
+                     search and fixed scroll pauses.
+        doc_workers: processes splitting up long documents. Only direct url2lines use
+                     should go parallel; crawl pool and pipeline workers pass 1, since
+                     they already fill the CPUs.
+        """
+        self.doc_workers = doc_workers
         self.driver = None
+        self.browser_pool = browser_pool
+        self.page_cache = page_cache
+        self.cache_mode = cache_mode
+        self.render_mode = render_mode
         
     def initialize_driver(self):
         if self.driver is not None:
             return
-            
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument('--disable-notifications')
-        chrome_options.add_argument('--ignore-certificate-errors')
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-        chrome_options.add_argument('--blink-settings=imagesEnabled=false')
-        chrome_options.add_argument('--disable-animations')
-        # chrome_options.add_argument('--disable-javascript')  # Disable JavaScript if not needed
-        prefs = {
-            "profile.default_content_setting_values.notifications": 2,
-            "profile.managed_default_content_settings.images": 2,  # Changed from 1 to 2 to disable images
-            # "profile.managed_default_content_settings.javascript": 2,  # Disable JavaScript
-        }
-        chrome_options.add_experimental_option("prefs", prefs)
-        
+        # Selenium is only imported once a page actually needs a browser
+        from selenium.common.exceptions import WebDriverException
+        from utils.browser_pool import create_driver
         try:
-            self.driver = webdriver.Chrome(options=chrome_options)
-            # Prevent detection
-            self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            self.driver.execute_cdp_cmd('Network.setUserAgentOverride', {
-                "userAgent": 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
-                            'AppleWebKit/537.36 (KHTML, like Gecko) '
-                            'Chrome/131.0.0.0 Safari/537.36'
-            })
+            self.driver = create_driver(self.render_mode)
         except WebDriverException as e:
             print(f"Error initializing WebDriver: {e}", file=sys.stderr)
             self.driver = None
 
     def cleanup(self):
         if self.driver:
-            try:
-                self.driver.quit()
-            except:
-                pass
+            from utils.browser_pool import quit_driver
+            quit_driver(self.driver)
             self.driver = None
 
-    def handle_cookie_popup(self, timeout=5):
+    def handle_cookie_popup(self, timeout=5, driver=None):
+        driver = driver or self.driver
         cookie_patterns = [
             # Buttons
             "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'accept')]",
@@ -116,10 +242,14 @@ class WebpageProcessor:
             "//button[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'aceptar')]",  # Spanish
         ]
 
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
         # Common button texts; extend this list as needed
         for pattern in cookie_patterns:
+            check_deadline("cookie popup")
             try:
-                cookie_button = WebDriverWait(self.driver, timeout).until(
+                cookie_button = WebDriverWait(driver, budget(timeout)).until(
                     EC.element_to_be_clickable((By.XPATH, pattern))
                 )
                 cookie_button.click()
@@ -132,116 +262,332 @@ class WebpageProcessor:
 
 
     # Add new function for scrolling
-    def scroll_page(self, pause_time=0.5):
+    def scroll_page(self, pause_time=0.5, driver=None):
         """Scroll the page to load dynamic content."""
+        driver = driver or self.driver
         try:
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
+            last_height = driver.execute_script("return document.body.scrollHeight")
             attempts = 0
             max_attempts = 5  # Limit scroll attempts
             
             while attempts < max_attempts:
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                sleep(pause_time)
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
+                check_deadline("scrolling")
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                sleep(budget(pause_time))
+                new_height = driver.execute_script("return document.body.scrollHeight")
                 
                 if new_height == last_height:
                     break
                 last_height = new_height
                 attempts += 1
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Scrolling error: {e}", file=sys.stderr)
+
+    def dismiss_consent(self, driver=None):
+        """Clicks through a consent banner in one script pass per document. Returns True if it clicked."""
+        driver = driver or self.driver
+        try:
+            clicked = driver.execute_script(CONSENT_SCRIPT)
+            if not clicked:
+                for frame in driver.execute_script(CONSENT_FRAME_SCRIPT) or []:
+                    check_deadline("consent banner")
+                    driver.switch_to.frame(frame)
+                    try:
+                        clicked = driver.execute_script(CONSENT_SCRIPT)
+                    finally:
+                        driver.switch_to.default_content()
+                    if clicked:
+                        break
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Consent dismissal error: {e}", file=sys.stderr)
+            return False
+        if clicked:
+            print(f"Clicked '{clicked}' for cookie consent.", file=sys.stderr)
+        return bool(clicked)
+
+    def scroll_until_stable(self, driver=None, max_scrolls=5, settle=0.5, poll=0.1):
+        """Scrolls to the bottom again only while the page grows within settle seconds of the last scroll."""
+        driver = driver or self.driver
+        height_script = "return document.body ? document.body.scrollHeight : 0"
+        try:
+            last_height = driver.execute_script(height_script)
+            for _ in range(max_scrolls):
+                check_deadline("scrolling")
+                driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+                waited = 0.0
+                grown = False
+                while waited < settle and not grown:
+                    sleep(budget(poll))
+                    waited += poll
+                    new_height = driver.execute_script(height_script)
+                    grown = new_height != last_height
+                if not grown:
+                    break
+                last_height = new_height
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Scrolling error: {e}", file=sys.stderr)
 
+    def render_page(self, driver, url, timeout=10):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+        check_deadline("selenium")
+        with stage("page_load"):
+            driver.set_page_load_timeout(max(1, budget(timeout)))
+            driver.get(url)
+
+            # Wait for the page to load
+            WebDriverWait(driver, budget(3)).until(
+                EC.presence_of_element_located((By.TAG_NAME, "body"))
+            )
+
+        if self.render_mode == 'fast':
+            with stage("cookie_popup"):
+                self.dismiss_consent(driver)
+            with stage("scroll"):
+                self.scroll_until_stable(driver)
+        else:
+            with stage("cookie_popup"):
+                self.handle_cookie_popup(timeout=1, driver=driver)
+            with stage("scroll"):
+                self.scroll_page(driver=driver)
+
+        page = driver.execute_script("return document.documentElement.outerHTML;")
+        note(method="selenium", bytes=len(page or ""))
+        return page
+
     def get_page_with_selenium(self, url, timeout=10):
+        if self.browser_pool is not None:
+            with self.browser_pool.lease() as driver:
+                if driver is None:
+                    fail("no_browser")
+                    return None
+                try:
+                    return self.render_page(driver, url, timeout)
+                except Exception as e:
+                    fail("deadline" if isinstance(e, DeadlineExceeded) else "selenium_failed")
+                    print(f"Selenium failed for {url}: {e}", file=sys.stderr)
+                    # The pool resets the tab instead of restarting the browser
+                    self.browser_pool.mark_stale(driver)
+                    return None
+
         if not self.driver:
-            self.initialize_driver()
+            with stage("browser_start"):
+                self.initialize_driver()
             print("Initialized driver")
             if not self.driver:
+                fail("no_browser")
                 return None
                 
         try:
-            self.driver.set_page_load_timeout(timeout)
-            self.driver.get(url)
-            
-            # Wait for the page to load
-            WebDriverWait(self.driver, 3).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            self.handle_cookie_popup(timeout=1)
-            self.scroll_page()
-            
-            return self.driver.execute_script("return document.documentElement.outerHTML;")
-            
+            return self.render_page(self.driver, url, timeout)
         except Exception as e:
+            fail("deadline" if isinstance(e, DeadlineExceeded) else "selenium_failed")
             print(f"Selenium failed for {url}: {e}", file=sys.stderr)
             # Reinitialize driver on failure
             self.cleanup()
             self.initialize_driver()
             return None
 
+    def get_cached_page(self, url):
+        """
+        Returns the cached page for url, revalidating it first in 'revalidate' mode.
+        Returns None when the page has to be fetched again.
+        """
+        cached = self.page_cache.get(url)
+        if cached is None:
+            return None
+        body, meta = cached
+        if self.cache_mode == 'prefer':
+            print("Cache hit "+url, file=sys.stderr)
+            return decode_file(body)
+
+        conditional_headers = self.page_cache.conditional_headers(meta)
+        if not conditional_headers:
+            return None
+        try:
+            response = requests.get(
+                url, headers={**DEFAULT_HEADERS, **conditional_headers}, stream=True, verify=VERIFY_TLS,
+                timeout=budget(DEFAULT_CONFIG.getint('DEFAULT', 'DOWNLOAD_TIMEOUT')))
+        except Exception as e:
+            print(f"Revalidation failed for {url}: {e}", file=sys.stderr)
+            return None
+        with response:
+            if response.status_code == 304:
+                print("Not modified "+url, file=sys.stderr)
+                self.page_cache.touch(url)
+                return decode_file(body)
+            if response.status_code != 200:
+                return None
+            try:
+                new_body = read_routed(url, response)
+            except NotHtml:
+                raise
+            except Exception as e:
+                print(f"Revalidation failed for {url}: {e}", file=sys.stderr)
+                return None
+        if not new_body:
+            return None
+        self.page_cache.put(url, new_body, response.headers)
+        return decode_file(new_body)
+
+    def fetch_page(self, url):
+        """
+        Streams url and returns the decoded page. The extractor is chosen from
+        the Content-Type and first bytes: documents, unusable binaries and
+        oversized bodies raise NotHtml (see read_routed).
+        """
+        min_size = DEFAULT_CONFIG.getint('DEFAULT', 'MIN_FILE_SIZE')
+        timeout = max(1, budget(DEFAULT_CONFIG.getint('DEFAULT', 'DOWNLOAD_TIMEOUT')))
+        with requests.get(url, headers=DEFAULT_HEADERS, stream=True, timeout=timeout, verify=VERIFY_TLS) as response:
+            if response.status_code != 200:
+                return None
+            body = read_routed(url, response)
+            headers = response.headers
+        if len(body) < min_size:
+            return None
+        if self.page_cache is not None:
+            self.page_cache.put(url, body, headers)
+        return decode_file(body)
+
     def get_page(self, url, method='auto'):
         page = None
+        if self.page_cache is not None:
+            with stage("cache"):
+                page = self.get_cached_page(url)
+            if page is not None:
+                note(method="cache", bytes=len(page))
+                return page
+
         if method in ['auto', 'trafilatura']:
             for i in range(3):
+                check_deadline("fetch")
                 try:
-                    page = trafilatura.fetch_url(url, config=DEFAULT_CONFIG)
+                    with stage("fetch"):
+                        page = self.fetch_page(url)
                     assert page is not None
+                    note(method="trafilatura", bytes=len(page))
                     print("Fetched "+url, file=sys.stderr)
                     break
+                except NotHtml:
+                    raise
                 except Exception as e:
                     print(f"Trafilatura failed for {url}: {i+1}/3", file=sys.stderr)
-                    sleep(3)
+                    with stage("retry_sleep"):
+                        sleep(budget(3))
         
         if page is None and method in ['auto', 'selenium']:
-            page = self.get_page_with_selenium(url)
+            with stage("selenium"):
+                page = self.get_page_with_selenium(url)
+            if page is not None and self.page_cache is not None:
+                self.page_cache.put(url, page, method="selenium")
+        if page is None:
+            fail("fetch_failed")
         return page
 
-    def html2lines(self, page):        
+    def html2lines(self, page, favor_recall=True, favor_precision=False):
         if page is None or len(page.strip()) == 0:
             return []
-        try:
-            text = trafilatura.extract(page, favor_recall=True, with_metadata=False)
-            reset_caches()
-            if text is None:
-                return []
-            return text.split("\n")
-        except Exception as e:
-            print(e)
-            return []
+        # Extraction can't be interrupted, so only start it with budget left
+        check_deadline("extraction")
+        with stage("extract"):
+            return html2lines(page, favor_recall, favor_precision)
 
-    def extract_doc_content(self, url):
+    def extract_doc_content(self, url, workers=None):
         """
-        Downloads a PDF from the given URL and extracts its content using wget.
+        Downloads a PDF, TXT or DOCX document into memory and extracts its text
+        with workers processes (default self.doc_workers).
         """
         try:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f".sav") as tmp_file:
-                temp_path = tmp_file.name
-            
-            # Download using wget
-            subprocess.run(['wget', '-O', temp_path, url], check=True, timeout=30)
+            with stage("doc_download"):
+                data = download_document(url)
+            note(method="pdf", bytes=len(data))
 
-            kind = filetype.guess(temp_path)
-            ftype = kind.extension if kind.extension else "txt"
-            print(f"Using Extension {ftype}")
-            
-            # Extract text
-            reader = pymupdf.open(temp_path, filetype=ftype)
-            text = ""
-            for page in reader:
-                text += page.get_text()
-            
-            return text.split("\n")
+            with stage("doc_extract"):
+                return document2lines(data, workers=workers or self.doc_workers)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
+            fail("doc_failed")
             print(f"Error extracting PDF content from {url}: {e}", file=sys.stderr)
             return []
-        finally:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
+
+    def not_html2lines(self, content):
+        """Lines of a NotHtml response: extracted documents, nothing for skipped content."""
+        if content.route != "document":
+            fail(content.reason)
+            print(f"Skipping {content}", file=sys.stderr)
+            return []
+        note(method="pdf", bytes=len(content.data))
+        try:
+            with stage("doc_extract"):
+                return document2lines(content.data, workers=self.doc_workers)
+        except Exception as e:
+            fail("doc_failed")
+            print(f"Error extracting document content from {content.url}: {e}", file=sys.stderr)
+            return []
 
     def url2lines(self, url, method='auto'):
         l_url = url.lower()
-        if l_url.endswith(('.pdf', '.txt', '.docx')):
+        if l_url.endswith(DOC_EXTENSIONS):
             return self.extract_doc_content(url)
-        page = self.get_page(url, method=method)
-        return self.html2lines(page)
\ No newline at end of file
+        try:
+            page = self.get_page(url, method=method)
+        except NotHtml as content:
+            return self.not_html2lines(content)
+        return self.html2lines(page)
+
+    def urls2lines(self, urls, method='auto', url_budget=None, methods=None, **fetcher_kwargs):
+        """
+        Batch version of url2lines: fetches all HTML pages concurrently with the
+        async fetcher and returns {url: lines}. Pages the fetcher could not get
+        fall back to Selenium when method is 'auto'.
+        methods optionally overrides method per URL ({url: method}).
+        url_budget bounds the fetch of each URL, and then separately its
+        Selenium fallback and extraction; URLs out of budget get [].
+        """
+        methods = methods or {}
+        results = {}
+        html_urls = []
+        for url in dict.fromkeys(urls):
+            if url.lower().endswith(DOC_EXTENSIONS):
+                results[url] = self._lines_within_budget(url_budget, self.extract_doc_content, url)
+            else:
+                html_urls.append(url)
+
+        fetch_urls = [url for url in html_urls if methods.get(url, method) in ['auto', 'trafilatura']]
+        pages = {}
+        if fetch_urls:
+            pages = fetch_pages(fetch_urls, page_cache=self.page_cache, cache_mode=self.cache_mode,
+                                url_budget=url_budget, **fetcher_kwargs)
+
+        for url in html_urls:
+            results[url] = self._lines_within_budget(
+                url_budget, self._render_and_extract, url, pages.get(url), methods.get(url, method))
+        return results
+
+    def _render_and_extract(self, url, page, method):
+        if isinstance(page, NotHtml):
+            return self.not_html2lines(page)
+        if page is None and method in ['auto', 'selenium']:
+            page = self.get_page_with_selenium(url)
+            if page is not None and self.page_cache is not None:
+                self.page_cache.put(url, page, method="selenium")
+        return self.html2lines(page)
+
+    @staticmethod
+    def _lines_within_budget(seconds, fn, url, *args):
+        with trace_url(url):
+            try:
+                with deadline(seconds):
+                    return fn(url, *args)
+            except DeadlineExceeded as e:
+                fail("deadline")
+                print(f"{e}: {url}", file=sys.stderr)
+                return []
\ No newline at end of file
@@ -0,0 +1,189 @@
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    payload TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',   -- pending, leased, done or failed
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (state, lease_expires);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Lease-based work queue in a SQLite database that several crawl nodes share
+    (on one machine, or on a network filesystem with working file locks).
+
+    Workers lease items for lease_seconds and renew their leases while they
+    work (heartbeat / keep_alive). A lease that expires, because its worker died
+    or hung, is re-issued to the next worker asking for work. Every lease counts
+    as an attempt; an item leased max_attempts times without being completed is
+    marked failed. Items are opaque ids with an optional JSON payload.
+    """
+    def __init__(self, path="data/crawl_queue.sqlite", lease_seconds=600, max_attempts=3, worker_id=None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = worker_id or default_worker_id()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = self._connect()
+        self.conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Autocommit mode; writes take the database lock up front with BEGIN IMMEDIATE.
+        # The rollback journal (not WAL) also works on network filesystems.
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    @contextmanager
+    def _transaction(self, conn=None):
+        conn = conn or self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def put(self, items):
+        """Queues items (ids, or a dict of id -> payload) that aren't queued yet. Returns how many were added."""
+        payloads = items if isinstance(items, dict) else dict.fromkeys(items)
+        now = time.time()
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO items (id, payload, updated) VALUES (?, ?, ?)",
+                [(str(item_id), None if payload is None else json.dumps(payload), now)
+                 for item_id, payload in payloads.items()])
+            return conn.total_changes - before
+
+    def lease(self, n=1):
+        """Leases up to n pending or expired items. Returns {id: payload}."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE items SET state = 'failed', worker = NULL, error = 'lease expired', updated = ? "
+                "WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            rows = conn.execute(
+                "SELECT id, payload FROM items "
+                "WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?) "
+                "ORDER BY attempts, rowid LIMIT ?", (now, n)).fetchall()
+            conn.executemany(
+                "UPDATE items SET state = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated = ? WHERE id = ?",
+                [(self.worker_id, now + self.lease_seconds, now, item_id) for item_id, _ in rows])
+        return {item_id: None if payload is None else json.loads(payload) for item_id, payload in rows}
+
+    def heartbeat(self, ids, conn=None):
+        """Renews this worker's leases on ids. Returns the ids whose lease it no longer holds."""
+        ids = [str(item_id) for item_id in ids]
+        now = time.time()
+        with self._transaction(conn) as conn:
+            conn.executemany(
+                "UPDATE items SET lease_expires = ?, updated = ? WHERE id = ? AND worker = ? AND state = 'leased'",
+                [(now + self.lease_seconds, now, item_id, self.worker_id) for item_id in ids])
+            held = {row[0] for row in conn.execute(
+                f"SELECT id FROM items WHERE worker = ? AND state = 'leased' AND id IN ({','.join('?' * len(ids))})",
+                [self.worker_id] + ids)} if ids else set()
+        return [item_id for item_id in ids if item_id not in held]
+
+    @contextmanager
+    def keep_alive(self, ids, interval=None):
+        """Heartbeats the leases on ids from a background thread for the duration of the block."""
+        interval = interval or self.lease_seconds / 3
+        stop = threading.Event()
+
+        def beat():
+            conn = self._connect()
+            try:
+                while not stop.wait(interval):
+                    try:
+                        lost = self.heartbeat(ids, conn)
+                    except sqlite3.Error as e:
+                        print(f"Heartbeat failed: {e}", file=sys.stderr)
+                        continue
+                    if lost:
+                        print(f"Lost the lease on {len(lost)} items", file=sys.stderr)
+            finally:
+                conn.close()
+
+        thread = threading.Thread(target=beat, name="work-queue-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete(self, ids):
+        """Marks ids done (even if their lease expired meanwhile: the work is done either way)."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE items SET state = 'done', worker = ?, lease_expires = NULL, error = NULL, updated = ? "
+                "WHERE id = ?", [(self.worker_id, now, str(item_id)) for item_id in ids])
+
+    def release(self, ids, error=None):
+        """Gives up this worker's leases on ids: they are re-issued, or failed after max_attempts attempts."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany(
+                "UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_expires = NULL, error = ?, updated = ? "
+                "WHERE id = ? AND worker = ? AND state = 'leased'",
+                [(self.max_attempts, error, now, str(item_id), self.worker_id) for item_id in ids])
+
+    def requeue_failed(self):
+        """Puts failed items back with a fresh attempt count. Returns how many."""
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE items SET state = 'pending', attempts = 0, worker = NULL, updated = ? "
+                "WHERE state = 'failed'", (time.time(),)).rowcount
+
+    def counts(self):
+        """Number of items per state; leases past their expiry are counted as 'expired'."""
+        counts = dict.fromkeys(("pending", "leased", "expired", "done", "failed"), 0)
+        rows = self.conn.execute(
+            "SELECT CASE WHEN state = 'leased' AND lease_expires < ? THEN 'expired' ELSE state END, COUNT(*) "
+            "FROM items GROUP BY 1", (time.time(),))
+        for state, count in rows:
+            counts[state] = count
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Show or repair a crawl work queue")
+    parser.add_argument('--queue', type=str, default='data/crawl_queue.sqlite')
+    parser.add_argument('--requeue_failed', action='store_true', help='Put failed items back in the queue')
+    args = parser.parse_args()
+    work_queue = WorkQueue(args.queue)
+    if args.requeue_failed:
+        print(f"Requeued {work_queue.requeue_failed()} failed items", file=sys.stderr)
+    print(json.dumps(work_queue.counts()))
+    for worker, leased in work_queue.conn.execute(
+            "SELECT worker, COUNT(*) FROM items WHERE state = 'leased' GROUP BY worker"):
+        print(f"{worker}: {leased} leased")
+    work_queue.close()
@@ -0,0 +1,320 @@
+import multiprocessing
+import pickle
+import sys
+import threading
+import time
+from collections import Counter, deque
+from multiprocessing.connection import wait
+
+import psutil
+
+# Process names of the browser stack a crawl worker may leave behind
+BROWSER_PROCESS_NAMES = ("chrome", "chromium", "chromedriver", "headless_shell")
+
+
+def process_tree(pid):
+    """psutil processes of pid and all its descendants (empty once it is gone)."""
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def tree_rss(processes):
+    """Summed resident memory in bytes of processes (ones that exited meanwhile count as 0)."""
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+def is_browser(process):
+    try:
+        name = process.name().lower()
+    except psutil.Error:
+        return False
+    return any(browser in name for browser in BROWSER_PROCESS_NAMES)
+
+
+def kill_processes(processes):
+    """Kills those of processes still running. Returns how many were killed."""
+    killed = 0
+    for process in processes:
+        try:
+            # is_running also compares the creation time, so a reused pid is left alone
+            if process.is_running():
+                process.kill()
+                killed += 1
+        except psutil.Error:
+            pass
+    return killed
+
+
+class WorkerLost(Exception):
+    """The worker process running a task exited before returning its result."""
+
+
+def _worker_main(conn, initializer, initargs, max_tasks, max_rss):
+    if initializer is not None:
+        initializer(*initargs)
+    me = psutil.Process()
+    done = 0
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        func, args = task
+        try:
+            ok, value = True, func(*args)
+        except Exception as e:
+            ok, value = False, e
+        done += 1
+        rss = tree_rss([me] + me.children(recursive=True))
+        retire = None
+        if max_tasks and done >= max_tasks:
+            retire = "max_tasks"
+        elif max_rss and rss > max_rss:
+            retire = "memory"
+        try:
+            conn.send((ok, value, retire, rss))
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            conn.send((False, RuntimeError(f"Unpicklable task result: {e!r}"), retire, rss))
+        if retire:
+            break
+    # Returning (rather than os._exit) runs the multiprocessing finalizers, e.g. the processor cleanup
+
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.task = None
+        self.rss = 0
+        self.browsers = {}  # pid -> psutil.Process of browser processes seen in the worker's tree
+        self.exit_deadline = None
+
+
+class WorkerPool:
+    """
+    Process pool (apply_async / close / join / terminate like multiprocessing.Pool)
+    whose workers are recycled to keep long crawls at flat memory.
+
+    A worker retires after returning the result of its max_tasks-th task, or of
+    any task after which its RSS, child processes (Chrome, chromedriver)
+    included, is over max_rss_mb; the pool then starts a replacement. The pool
+    also samples every worker's process tree every check_interval seconds:
+    a worker over kill_rss_mb is killed, and a worker that dies mid-task has
+    the task failed with WorkerLost through error_callback and is replaced.
+    Browser processes seen in a worker's tree are remembered, and any still
+    running once they have left the tree (their parent died or quit failed)
+    or once the worker exited are reaped as orphans.
+    """
+    def __init__(self, processes, initializer=None, initargs=(), max_tasks=None, max_rss_mb=None,
+                 kill_rss_mb=None, context=None, check_interval=5, exit_timeout=60):
+        self.context = context or multiprocessing.get_context()
+        self.initializer = initializer
+        self.initargs = initargs
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss_mb * 1024**2 if max_rss_mb else None
+        self.kill_rss = kill_rss_mb * 1024**2 if kill_rss_mb else None
+        self.check_interval = check_interval
+        self.exit_timeout = exit_timeout
+        self.recycled = Counter()
+        self.reaped = 0
+        self.peak_rss = 0
+        self._lock = threading.Lock()
+        self._backlog = deque()
+        self._closed = False
+        self._terminated = False
+        self._workers = [self._spawn() for _ in range(processes)]
+        self._exiting = []
+        self._handler = threading.Thread(target=self._handle, name="worker-pool", daemon=True)
+        self._handler.start()
+
+    def _spawn(self):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker_main, daemon=True,
+            args=(child_conn, self.initializer, self.initargs, self.max_tasks, self.max_rss))
+        process.start()
+        child_conn.close()
+        return _Worker(process, parent_conn)
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        with self._lock:
+            if self._closed:
+                raise ValueError("Pool not running")
+            self._backlog.append((func, args, callback, error_callback))
+        # The handler may be blocked in wait(); dispatching here gets the task going right away
+        self._dispatch()
+
+    def _dispatch(self):
+        with self._lock:
+            for worker in self._workers:
+                if not self._backlog:
+                    return
+                if worker.task is None:
+                    worker.task = self._backlog.popleft()
+                    try:
+                        worker.conn.send(worker.task[:2])
+                    except (OSError, ValueError):
+                        pass  # the worker is gone; _lost fails the task once its sentinel fires
+
+    def _retire(self, worker, reason):
+        """Moves worker from the pool to the exiting workers and starts its replacement. Call with the lock held."""
+        if worker not in self._workers:
+            return False
+        self._workers.remove(worker)
+        worker.exit_deadline = time.monotonic() + self.exit_timeout
+        self._exiting.append(worker)
+        if not self._terminated:
+            self._workers.append(self._spawn())
+        self.recycled[reason] += 1
+        return True
+
+    @staticmethod
+    def _finish(task, ok, value):
+        _, _, callback, error_callback = task
+        if ok and callback is not None:
+            callback(value)
+        elif not ok and error_callback is not None:
+            error_callback(value)
+
+    def _receive(self, worker):
+        try:
+            ok, value, retire, rss = worker.conn.recv()
+        except (EOFError, OSError):
+            self._lost(worker)
+            return
+        worker.rss = rss
+        self.peak_rss = max(self.peak_rss, rss)
+        # Retire before freeing the worker, or _dispatch could hand a task to a worker that is exiting
+        with self._lock:
+            if retire:
+                self._retire(worker, retire)
+            task, worker.task = worker.task, None
+        if retire:
+            print(f"Recycling worker {worker.process.pid} ({retire}, {rss / 1024**2:.0f} MB)", file=sys.stderr)
+        if task is not None:
+            self._finish(task, ok, value)
+
+    def _lost(self, worker, reason="died"):
+        with self._lock:
+            replaced = self._retire(worker, reason)
+            task, worker.task = worker.task, None
+        if replaced:
+            worker.process.join(1)
+            print(f"Worker {worker.process.pid} {reason} (exit code {worker.process.exitcode})", file=sys.stderr)
+        if task is not None:
+            self._finish(task, False, WorkerLost(f"worker {worker.process.pid} {reason}"))
+
+    def _watch(self):
+        """Samples the process trees of the workers: memory, browser children and orphans."""
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            tree = process_tree(worker.process.pid)
+            worker.rss = tree_rss(tree)
+            self.peak_rss = max(self.peak_rss, worker.rss)
+            in_tree = {process.pid for process in tree}
+            for process in tree[1:]:
+                if process.pid not in worker.browsers and is_browser(process):
+                    worker.browsers[process.pid] = process
+            orphans = [process for pid, process in worker.browsers.items() if pid not in in_tree]
+            for process in orphans:
+                del worker.browsers[process.pid]
+            self._reap(orphans)
+            if self.kill_rss and worker.rss > self.kill_rss:
+                print(f"Killing worker {worker.process.pid} at {worker.rss / 1024**2:.0f} MB", file=sys.stderr)
+                worker.process.kill()
+                self._reap(worker.browsers.values())
+                self._lost(worker, "killed")
+
+    def _reap(self, processes):
+        killed = kill_processes(processes)
+        if killed:
+            self.reaped += killed
+            print(f"Reaped {killed} orphaned browser processes", file=sys.stderr)
+
+    def _reap_exited(self):
+        for worker in list(self._exiting):
+            if worker.process.is_alive():
+                if time.monotonic() < worker.exit_deadline:
+                    continue
+                worker.process.kill()
+            worker.process.join()
+            worker.conn.close()
+            self._reap(worker.browsers.values())
+            self._exiting.remove(worker)
+            with self._lock:
+                task, worker.task = worker.task, None
+            if task is not None:
+                self._finish(task, False, WorkerLost(f"worker {worker.process.pid} exited with a task"))
+
+    def _handle(self):
+        last_check = time.monotonic()
+        while True:
+            self._dispatch()
+            with self._lock:
+                if self._terminated or (self._closed and not self._backlog
+                                        and all(w.task is None for w in self._workers)):
+                    return
+                workers = list(self._workers)
+            waitables = {}
+            for worker in workers:
+                waitables[worker.conn] = worker
+                waitables[worker.process.sentinel] = worker
+            for ready in wait(list(waitables), timeout=1):
+                worker = waitables[ready]
+                if ready is worker.conn:
+                    self._receive(worker)
+                else:
+                    self._lost(worker)
+            self._reap_exited()
+            if time.monotonic() - last_check >= self.check_interval:
+                last_check = time.monotonic()
+                self._watch()
+
+    def close(self):
+        """No more tasks; join() waits for the queued ones."""
+        with self._lock:
+            self._closed = True
+
+    def terminate(self):
+        """Stops right away: queued and running tasks are dropped without callbacks."""
+        with self._lock:
+            self._closed = self._terminated = True
+            self._backlog.clear()
+        self._handler.join()
+        for worker in self._workers:
+            worker.task = None
+            worker.process.terminate()
+            self._exiting.append(worker)
+
+    def join(self):
+        self._handler.join()
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.exit_deadline = time.monotonic() + self.exit_timeout
+            self._exiting.append(worker)
+        self._workers = []
+        while self._exiting:
+            self._reap_exited()
+            time.sleep(0.1)
+
+    def stats(self):
+        return {
+            "recycled": dict(self.recycled),
+            "reaped_browser_processes": self.reaped,
+            "peak_worker_rss_mb": round(self.peak_rss / 1024**2, 1),
+        }
@@ -0,0 +1,15 @@
+"""
+Imported once in the forkserver parent (multiprocessing set_forkserver_preload)
+so that every crawl or extraction worker forked from it starts with trafilatura
+loaded and warmed up and the public suffix list parsed, instead of redoing both
+per process. Selenium and pymupdf are left out: workers import them only when
+they render a page or extract a document.
+"""
+import trafilatura
+
+import utils.webpage_crawler
+from utils.url_utils import suffix_extractor
+
+suffix_extractor()
+# First extraction compiles trafilatura's XPath expressions and lxml parsers
+trafilatura.extract("<html><body><article><p>Warm up the extractor.</p></article></body></html>")